@@ -0,0 +1,134 @@
+"""Benchmarks the GUI's mod-host hot paths against mock_modhost.py.
+
+Drives MainWindow.launch_board, BoardWindow.swap_plugins,
+BoardWindow.remove_current_plugin and a single encoder tick end to end, with
+the mock adding a controlled latency to every command and round trip. For
+each operation it reports wall time, commands sent and round trips as JSON.
+
+    python benchmark.py --profile checkoff --repeat 5 --output bench.json
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+
+# Must be set before Qt, modhostmanager and journal are imported
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ["MULTIFX_MOCK_MODHOST"] = "1"
+os.environ["MULTIFX_JOURNAL"] = "0"
+
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+import modhostmanager  # noqa: E402
+from instrumentation import stats  # noqa: E402
+from qwidgets import core  # noqa: E402
+from qwidgets.core import MainWindow  # noqa: E402
+
+
+def measure(app: QApplication, action) -> dict:
+    """Runs action and waits for the mod-host thread to finish everything it
+    queued"""
+    commands = stats.commands_sent
+    round_trips = stats.round_trips
+    start = time.perf_counter()
+    action()
+    core.modhost.waitIdle()
+    app.processEvents()
+    return {
+        "wall_ms": (time.perf_counter() - start) * 1000,
+        "commands": stats.commands_sent - commands,
+        "round_trips": stats.round_trips - round_trips,
+    }
+
+
+def settle(app: QApplication):
+    """Waits out background work, like filling the warm plugin pool, that
+    queues more of itself from callbacks"""
+    while True:
+        round_trips = stats.round_trips
+        core.modhost.waitIdle()
+        # Deliver callbacks posted by the mod-host thread, then wait for
+        # whatever they queued
+        app.sendPostedEvents()
+        app.processEvents()
+        core.modhost.waitIdle()
+        if stats.round_trips == round_trips:
+            return
+
+
+def summarize(samples: list[dict]) -> dict:
+    walls = [sample["wall_ms"] for sample in samples]
+    return {
+        "runs": len(samples),
+        "wall_ms_median": round(statistics.median(walls), 3),
+        "wall_ms_max": round(max(walls), 3),
+        "commands": samples[-1]["commands"],
+        "round_trips": samples[-1]["round_trips"],
+    }
+
+
+def run(profile: str, repeat: int) -> dict:
+    app = QApplication.instance() or QApplication(sys.argv)
+    window = MainWindow()
+    # Its samples would land in the measurements
+    window.dsp.stop()
+    settle(app)
+    samples = {"launch_board": [], "swap_plugins": [],
+               "remove_current_plugin": [], "encoder_tick": []}
+
+    for _ in range(repeat):
+        samples["launch_board"].append(
+            measure(app, lambda: window.launch_board(profile)))
+        board = window.board_window
+        if len(board.plugins.plugins) >= 2:
+            samples["swap_plugins"].append(
+                measure(app, lambda: board.swap_plugins(1)))
+            board.pluginbox.scroll_group.goPrev()
+        board.show_param_screen(board.curItem())
+        if len(board.curItem().plugin.parameters) > 0:
+            samples["encoder_tick"].append(
+                measure(app, lambda: board.param_window.increaseParameter(0)))
+        board.back_to_board()
+        samples["remove_current_plugin"].append(
+            measure(app, board.remove_current_plugin))
+
+    core.modhost.stop()
+    return {name: summarize(runs) for name, runs in samples.items() if runs}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", default="checkoff",
+                        help="profile JSON in the config dir, without .json")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0005,
+                        help="mock seconds spent on each command")
+    parser.add_argument("--rtt", type=float, default=0.002,
+                        help="mock seconds added per round trip")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    os.environ["MULTIFX_MOCK_LATENCY"] = str(args.latency)
+    os.environ["MULTIFX_MOCK_RTT"] = str(args.rtt)
+    # Keep the app's own prints out of the report
+    with contextlib.redirect_stdout(sys.stderr):
+        operations = run(args.profile, args.repeat)
+    report = {
+        "profile": args.profile,
+        "mock": {"latency": args.latency, "rtt": args.rtt,
+                 "port": modhostmanager.MODHOST_PORT},
+        "operations": operations,
+    }
+    text = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""DSP load and xrun history, to tell which profiles are safe to play"""
+
+import collections
+import json
+import os
+import time
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+import startup
+from modhostmanager import cpuLoad
+from utils import logs_dir
+
+# How often load is sampled
+SAMPLE_MS = 500
+# Samples kept, ten minutes at the default rate
+HISTORY = 1200
+
+
+def sample(client) -> tuple[float | None, int | None]:
+    """mod-host's DSP load and the xruns jackd has reported since it
+    started, either None if unknown"""
+    log = startup.logs.get("jackd")
+    return cpuLoad(client), log.xruns if log is not None else None
+
+
+class DspMonitor(QObject):
+    """Samples DSP load and xruns at a fixed rate into a ring buffer.
+
+    Samples go through the mod-host thread like any other job, and one is
+    skipped if the last hasn't come back yet, so a busy mod-host isn't
+    queued up with them. Each sample is (time, load, new xruns, profile).
+    Peak load and xruns are counted from the last setProfile().
+    """
+    sampled = pyqtSignal()
+
+    def __init__(self, worker, rate_ms: int = SAMPLE_MS, size: int = HISTORY):
+        super().__init__()
+        self.worker = worker
+        self.rate_ms = rate_ms
+        self.history = collections.deque(maxlen=size)
+        self.profile = None
+        self.load = None
+        self.peak = None
+        self.xruns = 0
+        self.lastXruns = None  # jackd's count at the last sample
+        self.waiting = False
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.poll)
+        self.timer.start(rate_ms)
+
+    def setProfile(self, profile: str):
+        """Starts the peak and xrun count over for a newly loaded profile"""
+        self.profile = profile
+        self.load = None
+        self.peak = None
+        self.xruns = 0
+
+    def stop(self):
+        self.timer.stop()
+
+    def poll(self):
+        if self.waiting:
+            return
+        self.waiting = True
+        self.worker.submit(sample, callback=self.record)
+
+    def record(self, result):
+        self.waiting = False
+        load, xruns = result or (None, None)
+        new = 0
+        if xruns is not None:
+            if self.lastXruns is not None:
+                new = xruns - self.lastXruns
+                if new < 0:
+                    new = xruns  # jackd restarted and counts from 0 again
+            self.lastXruns = xruns
+        self.xruns += new
+        self.load = load
+        if load is not None and (self.peak is None or load > self.peak):
+            self.peak = load
+        self.history.append((time.time(), load, new, self.profile))
+        self.sampled.emit()
+
+    def summary(self) -> dict:
+        """Mean and peak load and xruns per profile, over the history"""
+        profiles: dict[str, dict] = {}
+        for _, load, xruns, profile in self.history:
+            entry = profiles.setdefault(str(profile), {
+                "samples": 0, "mean_load": 0.0, "peak_load": None, "xruns": 0})
+            entry["xruns"] += xruns
+            if load is None:
+                continue
+            entry["samples"] += 1
+            entry["mean_load"] += load
+            if entry["peak_load"] is None or load > entry["peak_load"]:
+                entry["peak_load"] = load
+        for entry in profiles.values():
+            if entry["samples"]:
+                entry["mean_load"] = round(
+                    entry["mean_load"] / entry["samples"], 3)
+        return profiles
+
+    def toJSON(self) -> dict:
+        return {
+            "sample_ms": self.rate_ms,
+            "profiles": self.summary(),
+            "samples": [
+                {"time": round(when, 3), "load": load, "xruns": xruns,
+                 "profile": profile}
+                for when, load, xruns, profile in self.history],
+        }
+
+    def dump(self, path: str = None) -> str:
+        """Writes the history as JSON, returns the path written to"""
+        if path is None:
+            os.makedirs(logs_dir, exist_ok=True)
+            path = os.path.join(
+                logs_dir, time.strftime("dsp_%Y%m%d_%H%M%S.json"))
+        with open(path, "w") as file:
+            json.dump(self.toJSON(), file, indent=4)
+        return path
@@ -0,0 +1,160 @@
+"""Always-on, low overhead instrumentation for the mod-host link.
+
+ModHostClient records every command here: a count, latency histogram and
+error tallies per command type, plus timeouts and round trips. The
+supervisor adds jackd and mod-host restarts. The hidden
+debug screen reads it and it can be dumped to a JSON file.
+"""
+
+import json
+import os
+import threading
+import time
+from utils import logs_dir
+
+# Upper bounds of the latency histogram buckets in ms. The last bucket
+# catches everything slower.
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+
+class CommandStats:
+    """Counters for one command type, e.g. every `connect`"""
+
+    def __init__(self):
+        self.count = 0
+        self.timeouts = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.errors: dict[int, int] = {}
+
+    def record(self, latency_ms: float, code: int):
+        self.count += 1
+        self.total_ms += latency_ms
+        if latency_ms > self.max_ms:
+            self.max_ms = latency_ms
+        bucket = 0
+        while (bucket < len(LATENCY_BUCKETS_MS)
+               and latency_ms > LATENCY_BUCKETS_MS[bucket]):
+            bucket += 1
+        self.histogram[bucket] += 1
+        if code < 0:
+            self.errors[code] = self.errors.get(code, 0) + 1
+
+    def mean_ms(self) -> float:
+        return self.total_ms / self.count if self.count else 0.0
+
+    def percentile_ms(self, percent: float) -> float:
+        """Upper bound of the bucket the percentile falls in"""
+        target = self.count * percent / 100
+        seen = 0
+        for bucket, hits in enumerate(self.histogram):
+            seen += hits
+            if hits and seen >= target:
+                if bucket < len(LATENCY_BUCKETS_MS):
+                    return LATENCY_BUCKETS_MS[bucket]
+                return self.max_ms
+        return 0.0
+
+    def toJSON(self) -> dict:
+        return {
+            "count": self.count,
+            "timeouts": self.timeouts,
+            "mean_ms": round(self.mean_ms(), 3),
+            "p90_ms": self.percentile_ms(90),
+            "max_ms": round(self.max_ms, 3),
+            "histogram": dict(zip(
+                [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + ["slower"],
+                self.histogram)),
+            "errors": {str(code): hits for code, hits in self.errors.items()},
+        }
+
+
+class ModHostStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.commands: dict[str, CommandStats] = {}
+            self.round_trips = 0
+            self.commands_sent = 0
+            self.restarts: dict[str, int] = {}
+            self.last_recovery_ms = None
+            # Components the supervisor stopped restarting
+            self.gave_up: list[str] = []
+
+    def _get(self, command: str) -> CommandStats:
+        name = command.split(" ", 1)[0]
+        stats = self.commands.get(name)
+        if stats is None:
+            stats = self.commands[name] = CommandStats()
+        return stats
+
+    def record_round_trip(self, size: int):
+        with self.lock:
+            self.round_trips += 1
+            self.commands_sent += size
+
+    def record(self, command: str, latency_ms: float, code: int):
+        with self.lock:
+            self._get(command).record(latency_ms, code)
+
+    def record_timeout(self, command: str):
+        with self.lock:
+            self._get(command).timeouts += 1
+
+    def record_restart(self, component: str, recovery_ms: float):
+        """A crashed jackd or mod-host was brought back by the supervisor"""
+        with self.lock:
+            self.restarts[component] = self.restarts.get(component, 0) + 1
+            self.last_recovery_ms = recovery_ms
+
+    def record_give_up(self, component: str):
+        """The supervisor stopped restarting a component that kept dying"""
+        with self.lock:
+            self.gave_up.append(component)
+
+    def timeouts(self) -> int:
+        with self.lock:
+            return sum(stats.timeouts for stats in self.commands.values())
+
+    def errors(self) -> dict[int, int]:
+        """Error code tallies across every command type"""
+        totals: dict[int, int] = {}
+        with self.lock:
+            for stats in self.commands.values():
+                for code, hits in stats.errors.items():
+                    totals[code] = totals.get(code, 0) + hits
+        return totals
+
+    def toJSON(self) -> dict:
+        with self.lock:
+            return {
+                "started": self.started,
+                "uptime_s": round(time.time() - self.started, 3),
+                "round_trips": self.round_trips,
+                "commands_sent": self.commands_sent,
+                "restarts": dict(self.restarts),
+                "last_recovery_ms": self.last_recovery_ms,
+                "gave_up": list(self.gave_up),
+                "commands": {name: stats.toJSON()
+                             for name, stats in self.commands.items()},
+            }
+
+    def dump(self, path: str = None) -> str:
+        """Writes the stats as JSON, returns the path written to"""
+        if path is None:
+            os.makedirs(logs_dir, exist_ok=True)
+            path = os.path.join(
+                logs_dir,
+                time.strftime("modhost_stats_%Y%m%d_%H%M%S.json"))
+        with open(path, "w") as file:
+            json.dump(self.toJSON(), file, indent=4)
+        return path
+
+
+# Shared by every mod-host connection in the process
+stats = ModHostStats()
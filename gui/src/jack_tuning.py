@@ -0,0 +1,154 @@
+"""Finds the lowest latency JACK buffer settings a profile runs without
+xruns and records them in the profile.
+
+Candidate period sizes and period counts are tried from the lowest latency
+up. For each, jackd and mod-host are started with it, the profile's chain is
+built and DSP load and xruns are sampled for a while. The first setting with
+no xruns and load under --max-load is written to the profile's "jack" field,
+which the GUI starts jackd with when the profile is loaded. Takes over jackd
+and mod-host, so run it with the GUI closed:
+
+    python jack_tuning.py --profile checkoff --seconds 20
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+import modhostmanager
+import startup
+from modhostmanager import applyDiff, cpuLoad, MOCK_MODHOST
+from dsp_monitor import SAMPLE_MS
+from pedal_graph import PedalGraph
+from plugin_manager import PluginManager
+from utils import config_dir
+
+# (period, nperiods) tried, lowest buffer latency first
+CANDIDATES = sorted(
+    ((period, nperiods) for period in (32, 64, 128, 256, 512)
+     for nperiods in (2, 3)),
+    key=lambda config: (config[0] * config[1], config[1]))
+MEASURE_S = 20.0
+# Peak DSP load in percent still taken as stable, leaving headroom for
+# parameter changes
+MAX_LOAD = 75.0
+
+
+def profiles() -> list[str]:
+    return sorted(name[:-len(".json")] for name in os.listdir(config_dir)
+                  if name.endswith(".json") and "all_plugins" not in name)
+
+
+def measure(client, seconds: float) -> tuple[float | None, int]:
+    """Peak DSP load and xruns over the next seconds"""
+    log = startup.logs.get("jackd")
+    first = log.xruns if log is not None else 0
+    peak = None
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        time.sleep(SAMPLE_MS / 1000)
+        load = cpuLoad(client)
+        if load is not None and (peak is None or load > peak):
+            peak = load
+    xruns = log.xruns - first if log is not None else 0
+    return peak, xruns
+
+
+def tryConfig(plugins: list, config: tuple[int, int], seconds: float,
+              max_load: float) -> dict:
+    """Runs the chain with config and reports how it went"""
+    period, nperiods = config
+    result = {"period": period, "nperiods": nperiods,
+              "latency_ms": round(
+                  period * nperiods / startup.SAMPLE_RATE * 1000, 3)}
+    modhostmanager.startJackdServer(config)
+    modhostmanager.startModHost()
+    client = modhostmanager.connectToModHost()
+    if client is None:
+        result.update(measured=False, stable=False)
+        return result
+    failed = applyDiff(client, PedalGraph().stage(plugins).build())
+    peak, xruns = measure(client, seconds)
+    client.close()
+    # Only the sound card's deadlines count, the mock and the dummy backend
+    # keep any setting
+    backend = "mock" if MOCK_MODHOST else startup.backend
+    result.update(backend=backend, peak_load=peak, xruns=xruns,
+                  failed_commands=len(failed), measured=backend == "alsa")
+    result["stable"] = (result["measured"] and not failed and xruns == 0
+                        and peak is not None and peak < max_load)
+    return result
+
+
+def recordConfig(path: str, config: tuple[int, int]):
+    """Sets the profile's "jack" field, keeping everything else"""
+    with open(path, "r") as file:
+        data = json.load(file)
+    data["jack"] = {"period": config[0], "nperiods": config[1]}
+    with open(path, "w") as file:
+        json.dump(data, file, indent=4)
+        file.write("\n")
+
+
+def tune(profile: str, seconds: float, max_load: float,
+         record: bool) -> dict:
+    path = os.path.join(config_dir, profile + ".json")
+    board = PluginManager()
+    board.initFromJSON(path)
+    results = []
+    best = None
+    for config in CANDIDATES:
+        print(f"{profile}: trying {config[0]}x{config[1]}", file=sys.stderr)
+        results.append(tryConfig(board.plugins, config, seconds, max_load))
+        if results[-1]["stable"]:
+            best = config
+            break
+        if results[-1].get("backend") not in (None, "alsa"):
+            print(f"{profile}: not on a sound card, nothing to measure",
+                  file=sys.stderr)
+            break
+    if best is None:
+        print(f"{profile}: no stable setting found", file=sys.stderr)
+    elif record:
+        recordConfig(path, best)
+    return {"best": best and {"period": best[0], "nperiods": best[1]},
+            "tried": results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--profile", action="append",
+                        help="profile JSON in the config dir, without .json."
+                        " Repeat for more, all profiles by default")
+    parser.add_argument("--seconds", type=float, default=MEASURE_S,
+                        help="how long each setting is measured")
+    parser.add_argument("--max-load", type=float, default=MAX_LOAD,
+                        help="highest peak DSP load in percent taken as"
+                        " stable")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="report only, don't change the profiles")
+    parser.add_argument("--output", help="write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    report = {}
+    # Keep jackd and mod-host chatter out of the report
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            for profile in args.profile or profiles():
+                report[profile] = tune(profile, args.seconds, args.max_load,
+                                       not args.dry_run)
+        finally:
+            modhostmanager.stopModHost()
+            startup.stop(modhostmanager.jackd_process)
+    text = json.dumps(report, indent=4)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
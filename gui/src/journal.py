@@ -0,0 +1,242 @@
+"""Board edits written ahead to disk, for undo and redo and to get the board
+back after a crash or power pull"""
+
+import json
+import os
+from PyQt5.QtCore import QObject, QTimer
+from plugin_manager import Plugin, PluginCatalog, PluginManager
+from profile_cache import ProfileCache
+from utils import state_dir
+
+# Set MULTIFX_JOURNAL=0 to keep edits in memory only, e.g. for benchmarks
+JOURNAL = os.environ.get("MULTIFX_JOURNAL", "1") not in ("", "0")
+JOURNAL_PATH = os.path.join(state_dir, "journal.jsonl")
+# Writes are synced to disk at most this often
+FLUSH_MS = 500
+
+
+def invert(plugins: list[Plugin], op: dict) -> dict:
+    """The op undoing op, from the board before op is applied"""
+    match op["op"]:
+        case "add":
+            return {"op": "remove", "index": len(plugins)}
+        case "remove":
+            return {"op": "insert", "index": op["index"],
+                    "plugin": plugins[op["index"]].copy()}
+        case "insert":
+            return {"op": "remove", "index": op["index"]}
+        case "swap":
+            return {"op": "swap", "index": op["other"], "other": op["index"]}
+        case "bypass":
+            return {"op": "bypass", "index": op["index"],
+                    "value": plugins[op["index"]].bypass}
+        case "param":
+            parameter = plugins[op["index"]].parameters[op["param"]]
+            return {"op": "param", "index": op["index"], "param": op["param"],
+                    "value": parameter.values[parameter.index]}
+    raise ValueError(f"unknown op {op['op']}")
+
+
+def applyOp(plugins: list[Plugin], op: dict):
+    """Applies an op to a board's plugins, without mod-host"""
+    match op["op"]:
+        case "add":
+            plugin = PluginCatalog.shared().byUri(op["uri"])
+            if plugin is None:
+                raise ValueError(f"no plugin {op['uri']} in the catalog")
+            plugins.append(plugin)
+        case "remove":
+            plugins.pop(op["index"])
+        case "insert":
+            # The op stays on the undo stack, so insert a copy
+            plugins.insert(op["index"], op["plugin"].copy())
+        case "swap":
+            a, b = op["index"], op["other"]
+            plugins[a], plugins[b] = plugins[b], plugins[a]
+        case "bypass":
+            plugins[op["index"]].bypass = op["value"]
+        case "param":
+            plugins[op["index"]].parameters[op["param"]].setValue(op["value"])
+        case _:
+            raise ValueError(f"unknown op {op['op']}")
+
+
+class Journal(QObject):
+    """Append-only log of the edits made to the board since its profile was
+    loaded.
+
+    Each line is a JSON op: a "load" naming the profile and its content
+    hash, then add, remove, swap, bypass and param ops in the order they
+    were made, and "undo" and "redo". Ops refer to plugins by their
+    position on the board. Callers record() an op before applying it, so
+    its inverse can be taken from the board as it was; undo() and redo()
+    hand back the op to apply. Both stacks hold (op, inverse) pairs, and
+    consecutive steps of the same parameter are one undo step.
+
+    Lines are written right away and synced to disk at most every
+    FLUSH_MS. resume() replays the journal over its profile, rebuilding
+    the stacks too.
+    """
+    instance = None
+
+    def __init__(self, path: str = JOURNAL_PATH):
+        super().__init__()
+        self.path = path
+        self.file = None
+        self.profile = None
+        # The board ops are taken against, changed in place by the caller
+        self.plugins: list[Plugin] | None = None
+        self.undos: list[tuple[dict, dict]] = []
+        self.redos: list[tuple[dict, dict]] = []
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+
+    def shared():
+        """The journal shared by the whole process"""
+        if Journal.instance is None:
+            Journal.instance = Journal()
+        return Journal.instance
+
+    def begin(self, profile: str, digest: str | None, plugins: list[Plugin]):
+        """Starts over for a freshly loaded profile"""
+        self.profile = profile
+        self.plugins = plugins
+        self.undos.clear()
+        self.redos.clear()
+        self.close()
+        if not JOURNAL:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.file = open(self.path, "w")
+        except OSError as e:
+            print(f"Can't write the journal: {e}")
+            return
+        self.write({"op": "load", "profile": profile, "digest": digest})
+        self.flush()
+
+    def follow(self, plugins: list[Plugin]):
+        """Takes ops against a board rebuilt from the same edits"""
+        self.plugins = plugins
+
+    def record(self, op: dict):
+        """Journals op, to be applied right after"""
+        if self.plugins is None:
+            return
+        inverse = invert(self.plugins, op)
+        if inverse == op:
+            return  # changes nothing, e.g. a parameter already at its max
+        self.push(op, inverse)
+        self.write(op)
+
+    def push(self, op: dict, inverse: dict):
+        self.redos.clear()
+        if self.undos and op["op"] == "param":
+            last, first = self.undos[-1]
+            if (last["op"] == "param" and last["index"] == op["index"]
+                    and last["param"] == op["param"]):
+                self.undos[-1] = op, first
+                return
+        self.undos.append((op, inverse))
+
+    def undo(self) -> dict | None:
+        """The op undoing the last edit, None if there is none"""
+        if not self.undos:
+            return None
+        op, inverse = self.undos.pop()
+        self.redos.append((op, inverse))
+        self.write({"op": "undo"})
+        return inverse
+
+    def redo(self) -> dict | None:
+        """The op redoing the last undone edit, None if there is none"""
+        if not self.redos:
+            return None
+        op, inverse = self.redos.pop()
+        self.undos.append((op, inverse))
+        self.write({"op": "redo"})
+        return op
+
+    def write(self, op: dict):
+        if self.file is None:
+            return
+        try:
+            self.file.write(json.dumps(op, separators=(",", ":")) + "\n")
+        except OSError as e:
+            print(f"Can't write the journal: {e}")
+            return
+        if not self.timer.isActive():
+            self.timer.start(FLUSH_MS)
+
+    def flush(self):
+        """Syncs what was written to disk"""
+        self.timer.stop()
+        if self.file is None:
+            return
+        try:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        except OSError as e:
+            print(f"Can't sync the journal: {e}")
+
+    def close(self):
+        if self.file is None:
+            return
+        self.flush()
+        self.file.close()
+        self.file = None
+
+    def resume(self) -> PluginManager | None:
+        """The board the journal leaves its profile in, None if there is
+        nothing to resume. Ops after a torn or unusable line are dropped,
+        and the profile must not have changed since the journal began."""
+        if not JOURNAL:
+            return None
+        self.close()
+        try:
+            with open(self.path, "rb") as file:
+                lines = file.readlines()
+        except OSError:
+            return None
+        try:
+            load = json.loads(lines[0])
+            profile, digest = load["profile"], load["digest"]
+        except (IndexError, ValueError, KeyError, TypeError):
+            return None
+        compiled = ProfileCache.shared().get(profile)
+        if digest is None or compiled.digest != digest:
+            print(f"{profile} changed since the journal began, not resuming")
+            return None
+        board = compiled.board()
+        self.profile = profile
+        self.plugins = board.plugins
+        self.undos.clear()
+        self.redos.clear()
+        end = len(lines[0])
+        for line in lines[1:]:
+            try:
+                if not line.endswith(b"\n"):
+                    raise ValueError("torn write")
+                op = json.loads(line)
+                match op["op"]:
+                    case "undo":
+                        applyOp(self.plugins, self.undo())
+                    case "redo":
+                        applyOp(self.plugins, self.redo())
+                    case _:
+                        self.record(op)
+                        applyOp(self.plugins, op)
+            except (ValueError, KeyError, IndexError, TypeError) as e:
+                print(f"Journal ends early, at {line!r}: {e}")
+                break
+            end += len(line)
+        print(f"Resuming {profile} with {len(self.undos)} edits to undo")
+        # Appends go after the last good op
+        try:
+            with open(self.path, "r+b") as file:
+                file.truncate(end)
+            self.file = open(self.path, "a")
+        except OSError as e:
+            print(f"Can't write the journal: {e}")
+        return board
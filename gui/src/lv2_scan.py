@@ -0,0 +1,448 @@
+"""Finds installed LV2 plugins by reading their bundles' Turtle files.
+
+Each bundle on LV2_PATH is read once: the plugins described in it are
+turned into all_plugins.json style entries and cached in the cache dir with
+the bundle's mtime. Later scans only read bundles that changed, so a
+library of hundreds of plugins is listed in milliseconds.
+"""
+
+import json
+import os
+import re
+import threading
+from urllib.parse import urljoin, unquote, urlparse
+from utils import cache_dir
+
+# Where lilv, and so mod-host, looks for bundles unless LV2_PATH is set
+DEFAULT_LV2_PATH = "~/.lv2:/usr/local/lib/lv2:/usr/lib/lv2"
+CACHE_FILE = "lv2_catalog.json"
+# Bump when the cached entries change shape
+CACHE_VERSION = 4
+# One scan at a time, they share the cache file
+scan_lock = threading.Lock()
+
+RDF = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+RDFS = "http://www.w3.org/2000/01/rdf-schema#"
+LV2 = "http://lv2plug.in/ns/lv2core#"
+ATOM = "http://lv2plug.in/ns/ext/atom#"
+PATCH = "http://lv2plug.in/ns/ext/patch#"
+PPROPS = "http://lv2plug.in/ns/ext/port-props#"
+DOAP = "http://usefulinc.com/ns/doap#"
+TYPE = RDF + "type"
+# Ports and properties the pedal has no use for
+HIDDEN = (LV2 + "reportsLatency", PPROPS + "notOnGUI")
+
+
+class IRI(str):
+    pass
+
+
+class BNode(str):
+    pass
+
+
+TOKEN = re.compile(r'''
+    (?P<skip>\s+|\#[^\n]*)
+  | (?P<iri><[^>]*>)
+  | (?P<string>"""(?:[^"\\]|\\.|"(?!""))*"""|\'\'\'(?:[^'\\]|\\.|'(?!''))*\'\'\'
+               |"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+  | (?P<number>[+-]?(?:\d*\.\d+(?:[eE][+-]?\d+)?|\d+(?:[eE][+-]?\d+)?))
+  | (?P<punct>\^\^|[\[\]\(\),;.])
+  | (?P<at>@[A-Za-z][\w-]*)
+  | (?P<name>_:[\w.-]*\w|[A-Za-z_][\w.-]*:(?:[\w.:%-]*[\w:%-])?
+             |:(?:[\w.:%-]*[\w:%-])?|[A-Za-z]\w*)
+''', re.X)
+ESCAPES = {"t": "\t", "n": "\n", "r": "\r", '"': '"', "'": "'", "\\": "\\"}
+
+
+def unescape(text: str) -> str:
+    return re.sub(r"\\(.)", lambda m: ESCAPES.get(m.group(1), m.group(1)),
+                  text)
+
+
+def tokenize(text: str) -> list[tuple[str, str]]:
+    tokens = []
+    position = 0
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if match is None:
+            raise ValueError(f"Unexpected {text[position:position + 20]!r}")
+        position = match.end()
+        if match.lastgroup != "skip":
+            tokens.append((match.lastgroup, match.group()))
+    return tokens
+
+
+class TurtleParser:
+    """The part of Turtle LV2 bundles use, into a subject -> predicate ->
+    objects dict. IRIs come out as IRI, blank nodes as BNode, and literals
+    as str, int, float or bool."""
+
+    def __init__(self, text: str, base: str, graph: dict = None):
+        self.tokens = tokenize(text)
+        self.position = 0
+        self.base = base
+        self.prefixes: dict[str, str] = {}
+        self.graph = graph if graph is not None else {}
+        self.blanks = 0
+
+    def peek(self) -> tuple[str, str]:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return ("end", "")
+
+    def next(self) -> tuple[str, str]:
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def expect(self, value: str):
+        kind, text = self.next()
+        if text != value:
+            raise ValueError(
+                f"Expected {value!r}, got {text or 'end of file'!r}")
+
+    def add(self, subject, predicate, obj):
+        self.graph.setdefault(subject, {}).setdefault(predicate, []).append(obj)
+
+    def blank(self) -> BNode:
+        self.blanks += 1
+        return BNode(f"_:b{id(self)}_{self.blanks}")
+
+    def parse(self) -> dict:
+        while self.peek()[0] != "end":
+            kind, text = self.peek()
+            if text in ("@prefix", "@base") or text.upper() in (
+                    "PREFIX", "BASE"):
+                self.directive()
+            else:
+                subject = self.subject()
+                if self.peek()[1] != ".":
+                    self.predicateObjects(subject)
+                self.expect(".")
+        return self.graph
+
+    def directive(self):
+        kind, text = self.next()
+        if text.lstrip("@").lower() == "prefix":
+            prefix = self.next()[1]
+            self.prefixes[prefix[:-1]] = self.iri(self.next()[1])
+        else:
+            self.base = self.iri(self.next()[1])
+        if text.startswith("@"):
+            self.expect(".")
+
+    def iri(self, text: str) -> IRI:
+        return IRI(urljoin(self.base, text[1:-1]))
+
+    def name(self, text: str):
+        if text.startswith("_:"):
+            # Labels only mean something within their file
+            return BNode(f"{text}_{id(self)}")
+        if text == "a":
+            return IRI(TYPE)
+        if text in ("true", "false"):
+            return text == "true"
+        prefix, _, local = text.partition(":")
+        if prefix not in self.prefixes:
+            raise ValueError(f"Unknown prefix {prefix!r}")
+        return IRI(self.prefixes[prefix] + local)
+
+    def subject(self):
+        kind, text = self.peek()
+        if text in ("[", "("):
+            return self.object()
+        self.next()
+        return self.iri(text) if kind == "iri" else self.name(text)
+
+    def predicateObjects(self, subject):
+        while True:
+            kind, text = self.next()
+            predicate = self.iri(text) if kind == "iri" else self.name(text)
+            while True:
+                self.add(subject, predicate, self.object())
+                if self.peek()[1] != ",":
+                    break
+                self.next()
+            # Any number of ;, even trailing ones
+            if self.peek()[1] != ";":
+                return
+            while self.peek()[1] == ";":
+                self.next()
+            if self.peek()[1] in (".", "]"):
+                return
+
+    def object(self):
+        kind, text = self.next()
+        match kind:
+            case "iri":
+                return self.iri(text)
+            case "name":
+                return self.name(text)
+            case "number":
+                return float(text) if any(c in text for c in ".eE") \
+                    else int(text)
+            case "string":
+                quotes = 3 if text[:3] in ('"""', "'''") else 1
+                value = unescape(text[quotes:-quotes])
+                if self.peek()[0] == "at":
+                    self.next()
+                elif self.peek()[1] == "^^":
+                    self.next()
+                    return typed(value, self.object())
+                return value
+        if text == "[":
+            node = self.blank()
+            if self.peek()[1] != "]":
+                self.predicateObjects(node)
+            self.expect("]")
+            return node
+        if text == "(":
+            items = []
+            while self.peek()[1] != ")":
+                items.append(self.object())
+            self.next()
+            return items
+        raise ValueError(f"Unexpected {text or 'end of file'!r}")
+
+
+def typed(value: str, datatype: str):
+    """A literal's value as the XML Schema type it is marked with"""
+    kind = datatype.rsplit("#", 1)[-1]
+    try:
+        if kind in ("integer", "int", "long", "short", "byte",
+                    "nonNegativeInteger", "positiveInteger"):
+            return int(value)
+        if kind in ("float", "double", "decimal"):
+            return float(value)
+    except ValueError:
+        return value
+    if kind == "boolean":
+        return value in ("true", "1")
+    return value
+
+
+def parseFile(path: str, graph: dict = None) -> dict:
+    with open(path, "r", encoding="utf-8") as file:
+        text = file.read()
+    base = "file://" + os.path.abspath(path)
+    return TurtleParser(text, base, graph).parse()
+
+
+def first(graph: dict, node, predicate: str, default=None):
+    values = graph.get(node, {}).get(predicate)
+    return values[0] if values else default
+
+
+def number(value, default: float) -> float:
+    return value if isinstance(value, (int, float)) \
+        and not isinstance(value, bool) else default
+
+
+def mode(properties: list, toggled: bool) -> str:
+    if toggled or LV2 + "toggled" in properties:
+        return "button"
+    if LV2 + "integer" in properties or LV2 + "enumeration" in properties:
+        return "selector"
+    return "dial"
+
+
+def bounds(graph: dict, node) -> tuple[float, float] | None:
+    """A control's (minimum, maximum), None if the range is empty, which the
+    parameter widgets can't step through"""
+    minimum = number(first(graph, node, LV2 + "minimum"), 0)
+    maximum = number(first(graph, node, LV2 + "maximum"), 1)
+    if not maximum > minimum:
+        return None
+    return minimum, maximum
+
+
+def portEntry(graph: dict, port) -> dict | None:
+    """A control input port as a parameter, None to leave it out"""
+    properties = graph.get(port, {}).get(LV2 + "portProperty", [])
+    if any(hidden in properties for hidden in HIDDEN):
+        return None
+    symbol = first(graph, port, LV2 + "symbol")
+    limits = bounds(graph, port)
+    if symbol is None or limits is None:
+        return None
+    minimum, maximum = limits
+    return {
+        "type": "lv2",
+        "name": first(graph, port, LV2 + "name", symbol),
+        "symbol": symbol,
+        "mode": mode(properties, False),
+        "default": number(first(graph, port, LV2 + "default"), minimum),
+        "min": minimum,
+        "max": maximum,
+    }
+
+
+def propertyEntry(graph: dict, parameter) -> dict | None:
+    """A patch:writable property as a parameter, None if it isn't a number
+    or has no range"""
+    kind = first(graph, parameter, RDFS + "range")
+    if kind not in (ATOM + "Float", ATOM + "Double", ATOM + "Int",
+                    ATOM + "Long", ATOM + "Bool"):
+        return None
+    limits = bounds(graph, parameter)
+    if limits is None:
+        return None
+    minimum, maximum = limits
+    properties = graph.get(parameter, {}).get(LV2 + "portProperty", [])
+    entry_mode = mode(properties, kind == ATOM + "Bool")
+    if entry_mode == "dial" and kind in (ATOM + "Int", ATOM + "Long"):
+        entry_mode = "selector"
+    return {
+        "type": "plug",
+        "name": first(graph, parameter, RDFS + "label", str(parameter)),
+        "symbol": str(parameter),
+        "mode": entry_mode,
+        "default": number(first(graph, parameter, LV2 + "default"), minimum),
+        "min": minimum,
+        "max": maximum,
+    }
+
+
+def pluginEntry(graph: dict, uri: IRI) -> dict:
+    """A plugin in the format of all_plugins.json"""
+    ports = sorted(graph.get(uri, {}).get(LV2 + "port", []),
+                   key=lambda port: number(first(graph, port, LV2 + "index"),
+                                           0))
+    inputs, outputs, parameters, monitors = [], [], [], []
+    for port in ports:
+        types = graph.get(port, {}).get(TYPE, [])
+        symbol = first(graph, port, LV2 + "symbol")
+        if LV2 + "AudioPort" in types:
+            if LV2 + "InputPort" in types:
+                inputs.append(symbol)
+            elif LV2 + "OutputPort" in types:
+                outputs.append(symbol)
+        elif LV2 + "ControlPort" in types and LV2 + "InputPort" in types:
+            entry = portEntry(graph, port)
+            if entry is not None:
+                parameters.append(entry)
+        elif LV2 + "ControlPort" in types and LV2 + "OutputPort" in types:
+            if symbol is not None:
+                monitors.append(symbol)
+    for parameter in graph.get(uri, {}).get(PATCH + "writable", []):
+        entry = propertyEntry(graph, parameter)
+        if entry is not None:
+            parameters.append(entry)
+    name = first(graph, uri, DOAP + "name") or first(
+        graph, uri, RDFS + "label") or str(uri).rstrip("/").rsplit("/", 1)[-1]
+    return {
+        "name": name,
+        "uri": str(uri),
+        "bypass": 0,
+        "channels": ("stereo" if len(inputs) >= 2 and len(outputs) >= 2
+                     else "mono"),
+        "inputs": inputs,
+        "outputs": outputs,
+        "parameters": parameters,
+        "monitors": monitors,
+    }
+
+
+def bundleFiles(bundle: str) -> list[str]:
+    return [os.path.join(bundle, name) for name in sorted(os.listdir(bundle))
+            if name.endswith(".ttl")]
+
+
+def bundleMtime(bundle: str) -> int:
+    """Changes when any Turtle file in the bundle is added, removed or
+    edited"""
+    mtime = os.stat(bundle).st_mtime_ns
+    for path in bundleFiles(bundle):
+        mtime = max(mtime, os.stat(path).st_mtime_ns)
+    return mtime
+
+
+def scanBundle(bundle: str) -> list[dict]:
+    """Entries for the effects in a bundle. The manifest names them and the
+    files it points to with rdfs:seeAlso describe them. Plugins without an
+    audio input and output, like instruments and MIDI tools, would cut the
+    chain and are left out."""
+    graph = parseFile(os.path.join(bundle, "manifest.ttl"))
+    plugins = [subject for subject, predicates in graph.items()
+               if IRI(LV2 + "Plugin") in predicates.get(TYPE, [])]
+    seen = {os.path.join(bundle, "manifest.ttl")}
+    for plugin in plugins:
+        for also in graph[plugin].get(RDFS + "seeAlso", []):
+            path = unquote(urlparse(also).path)
+            if path in seen or not path.endswith(".ttl") \
+                    or not os.path.isfile(path):
+                continue
+            seen.add(path)
+            parseFile(path, graph)
+    entries = [pluginEntry(graph, plugin) for plugin in plugins]
+    return [entry for entry in entries if entry["inputs"] and entry["outputs"]]
+
+
+def lv2Path() -> list[str]:
+    path = os.environ.get("LV2_PATH", DEFAULT_LV2_PATH)
+    return [os.path.expanduser(directory)
+            for directory in path.split(os.pathsep) if directory]
+
+
+def bundles() -> list[str]:
+    found = []
+    for directory in lv2Path():
+        try:
+            names = sorted(os.listdir(directory))
+        except OSError:
+            continue
+        for name in names:
+            bundle = os.path.join(directory, name)
+            if os.path.isfile(os.path.join(bundle, "manifest.ttl")):
+                found.append(bundle)
+    return found
+
+
+def loadCache(path: str) -> dict:
+    try:
+        with open(path, "r") as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or cache.get("version") != CACHE_VERSION:
+        return {}
+    return cache.get("bundles", {})
+
+
+def scan(cache_path: str = None) -> list[dict]:
+    """Entries for every installed plugin, reading only bundles that changed
+    since the cache was written"""
+    if cache_path is None:
+        cache_path = os.path.join(cache_dir, CACHE_FILE)
+    with scan_lock:
+        return scanWith(cache_path)
+
+
+def scanWith(cache_path: str) -> list[dict]:
+    cached = loadCache(cache_path)
+    scanned = {}
+    changed = False
+    for bundle in bundles():
+        try:
+            mtime = bundleMtime(bundle)
+        except OSError:
+            continue
+        entry = cached.get(bundle)
+        if entry is None or entry.get("mtime") != mtime:
+            changed = True
+            try:
+                entry = {"mtime": mtime, "plugins": scanBundle(bundle)}
+            except (OSError, ValueError, UnicodeDecodeError) as e:
+                print(f"Couldn't read LV2 bundle {bundle}: {e}")
+                entry = {"mtime": mtime, "plugins": []}
+        scanned[bundle] = entry
+    if changed or scanned.keys() != cached.keys():
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            with open(cache_path, "w") as file:
+                json.dump({"version": CACHE_VERSION, "bundles": scanned}, file)
+        except OSError as e:
+            print(f"Couldn't write the LV2 cache: {e}")
+    return [plugin for entry in scanned.values()
+            for plugin in entry["plugins"]]
@@ -0,0 +1,312 @@
+"""Pure-Python stand-in for mod-host, for tests and benchmarks.
+
+Speaks the same text protocol as modhostmanager.py over TCP and keeps the
+pedalboard (instances, parameters, bypass and port connections) in memory.
+Per-command latency and error injection can be configured so the GUI and
+benchmarks behave like they would against a slow or failing audio host.
+
+Run standalone with `python mock_modhost.py --port 55555`, or set
+MULTIFX_MOCK_MODHOST=1 so startModHost() runs one in-process instead of
+mod-host (see modhostmanager.py).
+"""
+
+import argparse
+import random
+import socket
+import socketserver
+import threading
+import time
+
+SYSTEM_PORTS = {
+    "system:capture_1", "system:capture_2",
+    "system:playback_1", "system:playback_2",
+}
+
+# mod-host status codes used by the mock
+SUCCESS = 0
+ERR_INSTANCE_INVALID = -1
+ERR_INSTANCE_ALREADY_EXISTS = -2
+ERR_INSTANCE_NON_EXISTS = -3
+ERR_LV2_INVALID_URI = -101
+ERR_JACK_PORT_CONNECTION = -205
+ERR_JACK_PORT_DISCONNECTION = -206
+ERR_INVALID_OPERATION = -402
+
+
+class MockInstance:
+    def __init__(self, uri: str):
+        self.uri = uri
+        self.bypass = 0
+        self.params: dict[str, float] = {}
+
+
+class MockModHost(socketserver.ThreadingTCPServer):
+    """In-memory mod-host.
+
+    latency: seconds spent handling each command, or a dict of seconds per
+        command name with "default" as the fallback
+    rtt: seconds added once per burst read off the socket, modelling the
+        cost of a round trip
+    error_rate: chance that any command fails with error_code
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, port: int, latency: float | dict = 0.0,
+                 rtt: float = 0.0, error_rate: float = 0.0,
+                 error_code: int = ERR_INVALID_OPERATION,
+                 feedback_port: int = None):
+        super().__init__(("localhost", port), MockHandler)
+        self.feedback = None
+        if feedback_port is not None:
+            self.feedback = FeedbackServer(feedback_port)
+        self.latency = latency
+        self.rtt = rtt
+        self.error_rate = error_rate
+        self.error_code = error_code
+        self.invalid_uris: set[str] = set()
+        self.injected: dict[str, list[int]] = {}
+        self.instances: dict[int, MockInstance] = {}
+        self.connections: set[tuple[str, str]] = set()
+        self.cpu_load = 0.0
+        self.commands = 0
+        self.lock = threading.Lock()
+        self.thread: threading.Thread = None
+        self.clients: list[socket.socket] = []
+
+    def start(self):
+        """Serves on a background thread"""
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        if self.feedback is not None:
+            threading.Thread(target=self.feedback.serve_forever,
+                             daemon=True).start()
+        return self
+
+    def stop(self):
+        """Shuts down like mod-host exiting, closing every connection"""
+        self.shutdown()
+        self.server_close()
+        for client in self.clients:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self.feedback is not None:
+            self.feedback.stop()
+
+    def emit(self, message: str):
+        """Sends a message to connected feedback clients, e.g.
+        `param_set 0 gain 0.5`. Updates the mock's own state to match."""
+        event = message.split()
+        if event[0] == "param_set":
+            with self.lock:
+                instance = self.instances.get(int(event[1]))
+                if instance is not None:
+                    instance.params[event[2]] = float(event[3])
+        if self.feedback is not None:
+            self.feedback.send(message)
+
+    def fail(self, command: str, code: int, count: int = 1):
+        """Makes the next count uses of a command fail with code"""
+        self.injected.setdefault(command, []).extend([code] * count)
+
+    def delay(self, name: str) -> float:
+        if isinstance(self.latency, dict):
+            return self.latency.get(name, self.latency.get("default", 0.0))
+        return self.latency
+
+    def port_exists(self, port: str) -> bool:
+        if port in SYSTEM_PORTS:
+            return True
+        name, _, symbol = port.partition(":")
+        if not name.startswith("effect_") or not symbol:
+            return False
+        try:
+            return int(name[len("effect_"):]) in self.instances
+        except ValueError:
+            return False
+
+    def handle_command(self, line: str) -> str:
+        args = line.split()
+        if not args:
+            return f"resp {ERR_INVALID_OPERATION}"
+        name = args[0]
+        time.sleep(self.delay(name))
+        with self.lock:
+            self.commands += 1
+            injected = self.injected.get(name)
+            if injected:
+                return f"resp {injected.pop(0)}"
+            if self.error_rate and random.random() < self.error_rate:
+                return f"resp {self.error_code}"
+            try:
+                return self.execute(name, args[1:])
+            except (IndexError, ValueError):
+                return f"resp {ERR_INVALID_OPERATION}"
+
+    def execute(self, name: str, args: list[str]) -> str:
+        match name:
+            case "add":
+                uri, instance = args[0], int(args[1])
+                if uri in self.invalid_uris:
+                    return f"resp {ERR_LV2_INVALID_URI}"
+                if instance in self.instances:
+                    return f"resp {ERR_INSTANCE_ALREADY_EXISTS}"
+                self.instances[instance] = MockInstance(uri)
+                return f"resp {instance}"
+            case "remove":
+                instance = int(args[0])
+                if instance == -1:
+                    removed = list(self.instances)
+                elif instance in self.instances:
+                    removed = [instance]
+                else:
+                    return f"resp {ERR_INSTANCE_NON_EXISTS}"
+                for instance in removed:
+                    del self.instances[instance]
+                    prefix = f"effect_{instance}:"
+                    self.connections = {
+                        edge for edge in self.connections
+                        if not edge[0].startswith(prefix)
+                        and not edge[1].startswith(prefix)
+                    }
+                return f"resp {SUCCESS}"
+            case "connect":
+                source, dest = args[0], args[1]
+                if not (self.port_exists(source) and self.port_exists(dest)):
+                    return f"resp {ERR_JACK_PORT_CONNECTION}"
+                self.connections.add((source, dest))
+                return f"resp {SUCCESS}"
+            case "disconnect":
+                edge = (args[0], args[1])
+                if edge not in self.connections:
+                    return f"resp {ERR_JACK_PORT_DISCONNECTION}"
+                self.connections.remove(edge)
+                return f"resp {SUCCESS}"
+            case "param_set" | "patch_set":
+                instance = self.instances.get(int(args[0]))
+                if instance is None:
+                    return f"resp {ERR_INSTANCE_NON_EXISTS}"
+                instance.params[args[1]] = float(args[2])
+                return f"resp {SUCCESS}"
+            case "param_get":
+                instance = self.instances.get(int(args[0]))
+                if instance is None:
+                    return f"resp {ERR_INSTANCE_NON_EXISTS}"
+                return f"resp {SUCCESS} {instance.params.get(args[1], 0.0)}"
+            case "bypass":
+                instance = self.instances.get(int(args[0]))
+                if instance is None:
+                    return f"resp {ERR_INSTANCE_NON_EXISTS}"
+                instance.bypass = int(args[1])
+                return f"resp {SUCCESS}"
+            case "cpu_load":
+                return f"resp {SUCCESS} {self.cpu_load}"
+            case "monitor_output" | "output_data_ready":
+                return f"resp {SUCCESS}"
+            case "quit":
+                return f"resp {SUCCESS}"
+        return f"resp {ERR_INSTANCE_INVALID}"
+
+
+class MockHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server: MockModHost = self.server
+        server.clients.append(self.request)
+        buffer = b""
+        while True:
+            try:
+                chunk = self.request.recv(4096)
+            except OSError:
+                return
+            if not chunk:
+                return
+            time.sleep(server.rtt)
+            buffer += chunk
+            replies = []
+            quit = False
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                line = line.decode().strip()
+                if not line:
+                    continue
+                replies.append(server.handle_command(line).encode() + b"\x00")
+                quit = quit or line.split()[0] == "quit"
+            self.request.sendall(b"".join(replies))
+            if quit:
+                # mod-host exits on quit
+                threading.Thread(target=server.stop, daemon=True).start()
+                return
+
+
+class FeedbackServer(socketserver.ThreadingTCPServer):
+    """mod-host's feedback port. Clients only ever receive."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, port: int):
+        super().__init__(("localhost", port), FeedbackHandler)
+        self.clients = []
+        self.closed = threading.Event()
+
+    def send(self, message: str):
+        for client in list(self.clients):
+            try:
+                client.sendall(message.encode() + b"\x00")
+            except OSError:
+                self.clients.remove(client)
+
+    def stop(self):
+        self.closed.set()
+        for client in self.clients:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        self.shutdown()
+        self.server_close()
+
+
+class FeedbackHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        self.server.clients.append(self.request)
+        self.server.closed.wait()
+
+
+server: MockModHost = None
+
+
+def restart(port: int, **kwargs) -> MockModHost:
+    """Stops the running in-process mock, if any, and starts a fresh one"""
+    global server
+    if server is not None:
+        server.stop()
+    server = MockModHost(port, **kwargs).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=55555)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="seconds spent on each command")
+    parser.add_argument("--rtt", type=float, default=0.0,
+                        help="seconds added per round trip")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="chance for any command to fail")
+    parser.add_argument("--feedback-port", type=int, default=None)
+    args = parser.parse_args()
+    mock = MockModHost(args.port, args.latency, args.rtt, args.error_rate,
+                       feedback_port=args.feedback_port)
+    print(f"mock mod-host listening on {args.port}")
+    mock.start()
+    try:
+        mock.thread.join()
+    except KeyboardInterrupt:
+        pass
+    mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Listens on mod-host's feedback port for asynchronous state events"""
+
+import socket
+from PyQt5.QtCore import QThread, pyqtSignal
+import modhostmanager
+from modhostmanager import ResponseReader, parseFeedback
+
+
+class FeedbackListener(QThread):
+    """Turns mod-host's feedback messages into Qt signals.
+
+    param_set events come from MIDI mapped controls and the like, output_set
+    events from the plugins' monitors, which PedalGraph registers as the
+    plugins join the board. Reconnects whenever mod-host restarts. mod-host
+    sends feedback in bursts ending in data_finish, and only sends the next
+    burst once output_data_ready has been sent on the command socket;
+    dataFinished signals when that's due.
+    """
+    paramChanged = pyqtSignal(int, str, float)  # instance, symbol, value
+    outputChanged = pyqtSignal(int, str, float)
+    dataFinished = pyqtSignal()
+
+    RETRY_S = 0.1
+    POLL_S = 0.5  # how often a blocked read checks for stop()
+
+    def __init__(self, port: int = modhostmanager.FEEDBACK_PORT):
+        super().__init__()
+        self.port = port
+        self.running = True
+
+    def stop(self):
+        self.running = False
+        self.wait()
+
+    def openSocket(self) -> socket.socket | None:
+        while self.running:
+            try:
+                sock = socket.create_connection(("localhost", self.port))
+                sock.settimeout(self.POLL_S)
+                return sock
+            except OSError:
+                self.msleep(int(self.RETRY_S * 1000))
+        return None
+
+    def handle(self, message: str):
+        event = parseFeedback(message)
+        if event is None:
+            print(f"Unparsable feedback from mod-host: {message}")
+            return
+        match event[0]:
+            case "param_set":
+                self.paramChanged.emit(*event[1:])
+            case "output_set":
+                self.outputChanged.emit(*event[1:])
+            case "data_finish":
+                self.dataFinished.emit()
+
+    def run(self):
+        while self.running:
+            sock = self.openSocket()
+            if sock is None:
+                break
+            reader = ResponseReader(sock)
+            try:
+                while self.running:
+                    try:
+                        self.handle(reader.read_message())
+                    except socket.timeout:
+                        continue
+            except (ConnectionError, OSError):
+                pass  # mod-host went away, wait for the next one
+            finally:
+                sock.close()
@@ -0,0 +1,170 @@
+"""Runs all mod-host I/O on its own thread so input handling and painting
+never wait on the audio host"""
+
+import queue
+import threading
+import time
+from PyQt5.QtCore import QThread, pyqtSignal
+import modhostmanager
+from plugin_manager import Parameter
+
+# Max rate parameter changes are flushed to mod-host, in Hz
+PARAMETER_RATE = 100
+
+
+class ParameterScheduler:
+    """Coalesces parameter changes from fast encoder spins.
+
+    Only the newest value for each (instance, symbol) is kept, and pending
+    values are handed out at most once per interval.
+    """
+
+    def __init__(self, rate: float = PARAMETER_RATE):
+        self.interval = 1 / rate
+        self.pending: dict[tuple[int, str], tuple[Parameter, float]] = {}
+        self.last_flush = 0.0
+        self.lock = threading.Lock()
+
+    def submit(self, instanceNum: int, parameter: Parameter) -> bool:
+        """Records the parameter's current value. Returns True if nothing was
+        pending before"""
+        with self.lock:
+            was_empty = not self.pending
+            self.pending[(instanceNum, parameter.symbol)] = (
+                parameter, parameter.value)
+        return was_empty
+
+    def timeout(self) -> float | None:
+        """Seconds until the next flush is due, None if nothing is pending"""
+        with self.lock:
+            if not self.pending:
+                return None
+        return max(0.0, self.last_flush + self.interval - time.monotonic())
+
+    def take(self) -> list[tuple[int, Parameter, float]]:
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        self.last_flush = time.monotonic()
+        return [(instanceNum, parameter, value) for (instanceNum, _), (
+            parameter, value) in pending.items()]
+
+
+class ModHostWorker(QThread):
+    """Owns the mod-host connection and runs jobs from a queue, in order.
+
+    A job is any modhostmanager helper; it is called with the worker's client
+    as its first argument followed by the submitted arguments. If a callback
+    is given it receives the helper's return value on the GUI thread.
+    """
+    done = pyqtSignal(object, object)  # callback, return value
+    connected = pyqtSignal(bool)
+    status = pyqtSignal(str)  # audio stack startup progress
+    lost = pyqtSignal()  # the mod-host connection broke
+
+    # Queued to wake the worker when parameters become pending
+    WAKE = object()
+
+    def __init__(self, parameter_rate: float = PARAMETER_RATE):
+        super().__init__()
+        self.jobs = queue.Queue()
+        self.client: modhostmanager.ModHostClient = None
+        self.scheduler = ParameterScheduler(parameter_rate)
+        self.lostClient = None  # client whose loss was reported
+        self.done.connect(self.deliver)
+
+    def submit(self, job, *args, callback=None):
+        """Queues job(client, *args) to run on the worker thread"""
+        self.jobs.put((job, args, callback))
+
+    def setParameter(self, instanceNum: int, parameter: Parameter):
+        """Schedules the parameter's current value to be sent. Superseded
+        values that haven't gone out yet are dropped."""
+        if self.scheduler.submit(instanceNum, parameter):
+            self.jobs.put(ModHostWorker.WAKE)
+
+    def startAudio(self, config: tuple[int, int] = None):
+        """Queues (re)starting jackd with config (see startJackdServer), then
+        mod-host and connecting to it"""
+        self.submit(self._startAudio, config)
+
+    def reset(self):
+        """Queues a restart of mod-host followed by a reconnect"""
+        self.submit(self._reset)
+
+    def stop(self):
+        self.jobs.put(None)
+        self.wait()
+
+    def waitIdle(self):
+        """Blocks until every queued job and pending parameter has been sent"""
+        self.jobs.join()
+        while self.scheduler.timeout() is not None:
+            self.jobs.put(ModHostWorker.WAKE)
+            self.jobs.join()
+
+    def deliver(self, callback, value):
+        callback(value)
+
+    def _startAudio(self, client, config):
+        self.status.emit("starting JACK")
+        modhostmanager.startJackdServer(config)
+        self._reset(client)
+
+    def _reset(self, client):
+        if client is not None:
+            client.close()
+        self.status.emit("starting mod-host")
+        modhostmanager.startModHost()
+        self.client = modhostmanager.connectToModHost()
+        self.status.emit("audio ready" if self.client is not None
+                         else "mod-host failed to start")
+        self.connected.emit(self.client is not None)
+
+    def flushParameters(self):
+        updates = self.scheduler.take()
+        if not updates or self.client is None:
+            return
+        for instanceNum, parameter in modhostmanager.setParameters(
+                self.client, updates):
+            print(f"Failed to update {parameter.name} on instance {instanceNum}")
+        self.checkConnection()
+
+    def checkConnection(self):
+        """Reports a broken connection, once per connection"""
+        client = self.client
+        if client is not None and client.lost and client is not self.lostClient:
+            self.lostClient = client
+            self.lost.emit()
+
+    def runJob(self, job, args, callback):
+        try:
+            value = job(self.client, *args)
+        except Exception as e:
+            print(f"mod-host job {job.__name__} failed: {e}")
+            value = None
+        if callback is not None:
+            self.done.emit(callback, value)
+        self.checkConnection()
+
+    def run(self):
+        while True:
+            try:
+                job = self.jobs.get(timeout=self.scheduler.timeout())
+            except queue.Empty:
+                self.jobs.put(ModHostWorker.WAKE)
+                continue
+            try:
+                if job is ModHostWorker.WAKE:
+                    if self.scheduler.timeout() == 0:
+                        self.flushParameters()
+                    continue
+                # Send pending values first so they stay ordered with other
+                # jobs
+                self.flushParameters()
+                if job is None:
+                    break
+                self.runJob(*job)
+            finally:
+                self.jobs.task_done()
+        if self.client is not None:
+            self.client.close()
@@ -1,779 +1,517 @@
 import subprocess
 import socket
+from contextlib import contextmanager
 import os
 import time
 import sys
 import plugin_manager
+import startup
+from instrumentation import stats
 
 PRINT_CMDS = False
-MODHOST_PORT = 55555
+MODHOST_PORT = int(os.environ.get("MODHOST_PORT", 55555))
+# mod-host pushes parameter changes and output monitor values on this port
+FEEDBACK_PORT = int(os.environ.get("MODHOST_FEEDBACK_PORT", MODHOST_PORT + 1))
+
+# Set MULTIFX_MOCK_MODHOST=1 to run against the in-process stand-in from
+# mock_modhost.py instead of mod-host and jackd. MULTIFX_MOCK_LATENCY,
+# MULTIFX_MOCK_RTT and MULTIFX_MOCK_ERROR_RATE configure it.
+MOCK_MODHOST = os.environ.get("MULTIFX_MOCK_MODHOST", "0") not in ("", "0")
 
 SYSIN1 = "system:capture_1"
 SYSIN2 = "system:capture_2"
 SYSOUT1 = "system:playback_1"
 SYSOUT2 = "system:playback_2"
 
-
-def startModHost():
-    # Starting mod-host -n(no ui) -p 5555(w/ port 5555)
-    mod_host_cmd = ["mod-host", "-n", "-p", str(MODHOST_PORT)]
-    try:
-        subprocess.run(["killall", "mod-host"], check=False)
-
-        if sys.platform.startswith("linux"):
-            process = subprocess.Popen(
-                    mod_host_cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    preexec_fn=os.setpgrp
-            )
-        else:
-            print("Unsupported OS")
-            return None
-        return process
-
-    except Exception as e:
-        print(f"Failed to start: {e}")
-        return None
+# The jackd and mod-host we started, if any
+jackd_process: subprocess.Popen = None
+modhost_process: subprocess.Popen = None
+# (period, nperiods) jackd was last started with
+jack_config = (startup.PERIOD, startup.NPERIODS)
 
 
-def startJackdServer():
-    try:
-        jackd_cmd = [
-                "/usr/bin/jackd", "-d", "alsa", "-d", "hw:sndrpihifiberry",
-                "-r", "96000", "-p", "128"
-        ]
-
-        if sys.platform.startswith("linux"):
-            try:
-                process = subprocess.Popen(
-                    jackd_cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    # Makes it independent of the parent process
-                    preexec_fn=os.setpgrp,
-                )
-                # check to make sure that process doesn't error out
-                time.sleep(2)  # give time to become stable
-
-                # check for failure by seeing if process has ended or open failed
-                jackd_failed: bool = process.poll() is not None
-                if not jackd_failed and "Failed to open" in subprocess.communicate(timeout=2):
-                    jackd_failed = True
-                if jackd_failed:
-                    # process ended
-                    print("JACK server failed to start. Falling back to dummy.")
-                    subprocess.run(["killall", "mod-host"], check=False)
-                    jackd_cmd = [
-                            "/usr/bin/jackd", "-d", "dummy", "-r", "96000",
-                            "-p", "128"
-                    ]
-                    process = subprocess.Popen(
-                        jackd_cmd,
-                        stdout=subprocess.PIPE,
-                        stderr=subprocess.PIPE,
-                        # Makes it independent of the parent process
-                        preexec_fn=os.setpgrp,
-                    )
-                else:
-                    print("JACK server started successfully.")
-            except Exception as e:
-                print(f"Error starting JACK server: {e}")
-                return None
-        else:
-            print("Unsupported OS")
-            return None
+def stopModHost():
+    """Stops the mod-host we started. Not an exit for the supervisor to act
+    on"""
+    global modhost_process
+    process, modhost_process = modhost_process, None
+    startup.stop(process)
 
-        return process
 
-    except Exception as e:
-        print(f"Failed to start: {e}")
+def startModHost():
+    global modhost_process
+    if MOCK_MODHOST:
+        import mock_modhost
+        modhost_process = None
+        return mock_modhost.restart(
+            MODHOST_PORT,
+            feedback_port=FEEDBACK_PORT,
+            latency=float(os.environ.get("MULTIFX_MOCK_LATENCY", 0)),
+            rtt=float(os.environ.get("MULTIFX_MOCK_RTT", 0)),
+            error_rate=float(os.environ.get("MULTIFX_MOCK_ERROR_RATE", 0)),
+        )
+    if not sys.platform.startswith("linux"):
+        print("Unsupported OS")
+        return None
+    # Starting mod-host -n(no ui) -p 55555(w/ port 55555) -f 55556(feedback)
+    mod_host_cmd = ["mod-host", "-n", "-p", str(MODHOST_PORT),
+                    "-f", str(FEEDBACK_PORT)]
+    stopModHost()
+    subprocess.run(["killall", "mod-host"], check=False)
+    modhost_process = startup.launch("mod-host", mod_host_cmd)
+    return modhost_process
+
+
+def startJackdServer(config: tuple[int, int] = None):
+    """Starts jackd with config, (period, nperiods), or the last one used.
+    Replaces the jackd we started before, and mod-host has to be started
+    again after"""
+    global jackd_process, jack_config
+    if config is not None:
+        jack_config = tuple(config)
+    if MOCK_MODHOST:
+        print("Using mock mod-host, not starting JACK")
+        return None
+    if not sys.platform.startswith("linux"):
+        print("Unsupported OS")
         return None
+    # mod-host goes down with jackd anyway
+    stopModHost()
+    process, jackd_process = jackd_process, None
+    startup.stop(process)
+    jackd_process = startup.startAudio(*jack_config)
+    return jackd_process
 
 
-def connectToModHost():
+def connectToModHost(deadline_s: float = startup.DEADLINE_S):
+    """Connects as soon as mod-host accepts, giving up early if it exits"""
     HOST = "localhost"
+    client = None
 
-    sock = None
-    error_list: list[str] = []
-
-    for _ in range(5):
+    def probe():
+        nonlocal client
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(2)  # Set the response timeout to 2 seconds
-            sock.connect((HOST, MODHOST_PORT))
-            print("Connected via socket")
-            return sock
-        except ConnectionRefusedError as e:
-            error_list.append(f"Socket couldn't connect: {e}")
-            time.sleep(1)
+            # Set the response timeout to 2 seconds
+            sock = socket.create_connection((HOST, MODHOST_PORT), timeout=2)
+        except OSError:
+            return False
+        client = ModHostClient(sock)
+        return True
 
-    print("Socket couldn't make a connection")
-    for err in error_list:
-        print(err)
-    return None
+    def failed():
+        return modhost_process is not None and modhost_process.poll() is not None
 
+    if startup.waitFor(probe, time.monotonic() + deadline_s, failed):
+        print("Connected via socket")
+        return client
 
-def sendCommand(sock, command):
-    if PRINT_CMDS:
-        print(command)
-    try:
-        sock.sendall(command.encode()+b"\n")
-        response = sock.recv(1024)
-        return response.decode().replace('\x00', '')
-    except socket.timeout:
-        print(f"Socket timeout for command: {command}")
-        return ""
-    except Exception as e:
-        print(f"Failed to send command: {e}")
-        return None
-
-
-def quitModHost(sock):
-    command = "quit"
-    try:
-        return int(sendCommand(sock, command).split()[1])
-    except Exception as e:
-        print(e)
-        return -5
+    print("Socket couldn't make a connection")
+    log = startup.logs.get("mod-host")
+    if log is not None:
+        for line in log.tail()[-10:]:
+            print(line)
+    return None
 
 
-def addEffect(sock, plugin: plugin_manager.Plugin, instanceNum: int):
-    command = f"add {plugin.uri} {instanceNum}"
-    try:
-        return int(sendCommand(sock, command).split()[1])
-    except Exception as e:
-        print(f"Error addingEffect {e}")
-        return -5
+# Error codes from mod-host's mod-host.h. -5 is our own generic failure code.
+ERRORS = {
+    -1: "ERR_INSTANCE_INVALID",
+    -2: "ERR_INSTANCE_ALREADY_EXISTS",
+    -3: "ERR_INSTANCE_NON_EXISTS",
+    -4: "ERR_INSTANCE_UNLICENSED",
+    -5: "ERR_NO_RESPONSE",
+    -101: "ERR_LV2_INVALID_URI",
+    -102: "ERR_LV2_INSTANTIATION",
+    -103: "ERR_LV2_INVALID_PARAM_SYMBOL",
+    -104: "ERR_LV2_INVALID_PRESET_URI",
+    -105: "ERR_LV2_CANT_LOAD_STATE",
+    -201: "ERR_JACK_CLIENT_CREATION",
+    -202: "ERR_JACK_CLIENT_ACTIVATION",
+    -203: "ERR_JACK_CLIENT_DEACTIVATION",
+    -204: "ERR_JACK_PORT_REGISTER",
+    -205: "ERR_JACK_PORT_CONNECTION",
+    -206: "ERR_JACK_PORT_DISCONNECTION",
+    -207: "ERR_JACK_VALUE_OUT_OF_RANGE",
+    -301: "ERR_ASSIGNMENT_ALREADY_EXISTS",
+    -302: "ERR_ASSIGNMENT_INVALID_OP",
+    -303: "ERR_ASSIGNMENT_LIST_FULL",
+    -304: "ERR_ASSIGNMENT_FAILED",
+    -305: "ERR_ASSIGNMENT_UNUSED",
+    -401: "ERR_MEMORY_ALLOCATION",
+    -402: "ERR_INVALID_OPERATION",
+}
+
+
+class Response:
+    """A parsed `resp <code> [value]` message"""
+
+    def __init__(self, code: int, value: float | str | None = None,
+                 raw: str = ""):
+        self.code = code
+        self.value = value
+        self.raw = raw
+
+    def ok(self) -> bool:
+        return self.code >= 0
+
+    def error(self) -> str | None:
+        if self.ok():
+            return None
+        return ERRORS.get(self.code, f"ERR_UNKNOWN({self.code})")
 
+    def parse(raw: str):
+        tokens = raw.split()
+        try:
+            if tokens[0] != "resp":
+                raise ValueError
+            code = int(tokens[1])
+        except (IndexError, ValueError):
+            return Response(-5, raw=raw)
+        value = None
+        if len(tokens) > 2:
+            value = " ".join(tokens[2:])
+            try:
+                value = float(value)
+            except ValueError:
+                pass
+        return Response(code, value, raw)
 
-def connectMonoToMono(sock, source, dest):
-    command = f"connect {source} {dest}"
-    try:
-        return int(sendCommand(sock, command).split()[1])
-    except Exception as e:
-        print(f"Error connectingEffects {e}")
-        return -5
 
+class ResponseReader:
+    """Frames mod-host's NUL-terminated messages off a socket.
 
-def connectMonoToStereo(sock, source, dest_in_1, dest_in_2):
-    command = f"connect {source} {dest_in_1}"
-    try:
-        response = sendCommand(sock, command).split()[1]
-    except Exception as e:
-        print(f"Error connectingEffects {e}")
-        return -5
+    Bytes past the last NUL are kept for the next read, so replies that are
+    split across recv() calls or merged into one are still handed out one at
+    a time and in order. Replies owed to commands that already timed out are
+    discarded so they aren't attributed to later commands.
+    """
 
-    command = f"connect {source} {dest_in_2}"
-    try:
-        return [response, sendCommand(sock, command).split()[1]]
-    except Exception as e:
-        print(f"Error connectingEffects {e}")
-        return -5
-
-
-def connectStereoToStereo(
-        sock, source_out_1, source_out_2, dest_in_1, dest_in_2,
-        flipped: bool = False
-):
-    res = ""
-    if flipped:
-        command = f"connect {source_out_1} {dest_in_2}"
-        try:
-            res = sendCommand(sock, command)
-            response = res.split()[1]
-        except Exception as e:
-            print(f"Error connectingEffects {e}. Result: {res}")
-            return -5
-        command = f"connect {source_out_2} {dest_in_1}"
-        try:
-            res = sendCommand(sock, command)
-            return [response, res.split()[1]]
-        except Exception as e:
-            print(f"Error connectingEffects {e}: Result: {res}")
-            return -5
-    else:
-        command = f"connect {source_out_1} {dest_in_1}"
-        try:
-            res = sendCommand(sock, command)
-            response = res.split()[1]
-        except Exception as e:
-            print(f"Error connectingEffects {e}. Result: {res}")
-            return -5
-        command = f"connect {source_out_2} {dest_in_2}"
-        try:
-            res = sendCommand(sock, command)
-            return [response, res.split()[1]]
-        except Exception as e:
-            print(f"Error connectingEffects {e}: Result: {res}")
-            return -5
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.buffer = bytearray()
+        self.stale = 0  # replies still owed to timed out commands
+
+    def read_message(self) -> str:
+        """Blocks until one full message arrives. Raises socket.timeout"""
+        while True:
+            end = self.buffer.find(b"\x00")
+            if end != -1:
+                message = self.buffer[:end].decode(errors="replace")
+                del self.buffer[:end + 1]
+                return message.strip()
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("mod-host closed the connection")
+            self.buffer += chunk
+
+    def read(self) -> Response:
+        while self.stale > 0:
+            self.read_message()
+            self.stale -= 1
+        return Response.parse(self.read_message())
+
+    def skip(self, count: int):
+        """Marks replies for count commands as never wanted"""
+        self.stale += count
+
+
+class CommandResult:
+    """Result of a single mod-host command. Filled in when its batch is
+    flushed; code is -5 if no usable response came back."""
+
+    def __init__(self, command: str):
+        self.command = command
+        self.response: Response | None = None
+        self.code: int | None = None
+        self.value: float | str | None = None
+
+    def done(self) -> bool:
+        return self.code is not None
+
+    def resolve(self, response: Response):
+        self.response = response
+        self.code = response.code
+        self.value = response.value
+
+    def __repr__(self):
+        return f"CommandResult({self.command!r}, code={self.code})"
+
+
+class ModHostClient:
+    """Pipelined connection to mod-host.
+
+    Commands queued inside a batch() are written in one burst when the
+    outermost batch exits. mod-host answers commands in the order it receives
+    them, so responses are matched back to their CommandResult by position.
+    Outside of a batch every command is flushed immediately. Every command
+    is recorded in instrumentation.stats. Once the connection is lost every
+    command fails right away with -5.
+    """
 
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.reader = ResponseReader(sock)
+        self.pending: list[CommandResult] = []
+        self.depth = 0  # nesting level of batch()
+        self.lost = False  # mod-host closed the socket or went away
 
-def disconnectStereoToStereo(
-        sock, source_out_1, source_out_2, dest_in_1, dest_in_2,
-        flipped: bool = False
-):
-    res = ""
-    if flipped:
-        command = f"disconnect {source_out_1} {dest_in_2}"
-        try:
-            res = sendCommand(sock, command)
-            response = res.split()[1]
-        except Exception as e:
-            print(f"Error disconnectingEffects {e}. Result: {res}")
-            return -5
-        command = f"disconnect {source_out_2} {dest_in_1}"
-        try:
-            res = sendCommand(sock, command)
-            return [response, res.split()[1]]
-        except Exception as e:
-            print(f"Error connectingEffects {e}: Result: {res}")
-            return -5
-    else:
-        command = f"disconnect {source_out_1} {dest_in_1}"
+    @contextmanager
+    def batch(self):
+        self.depth += 1
         try:
-            res = sendCommand(sock, command)
-            response = res.split()[1]
-        except Exception as e:
-            print(f"Error disconnectingEffects {e}. Result: {res}")
-            return -5
-        command = f"disconnect {source_out_2} {dest_in_2}"
+            yield self
+        finally:
+            self.depth -= 1
+            if self.depth == 0:
+                self.flush()
+
+    def queue(self, command: str) -> CommandResult:
+        """Queues a command. Sent right away unless inside a batch."""
+        if PRINT_CMDS:
+            print(command)
+        result = CommandResult(command)
+        self.pending.append(result)
+        if self.depth == 0:
+            self.flush()
+        return result
+
+    def send(self, command: str) -> CommandResult:
+        """Sends a command along with anything already queued and waits for
+        its response, even inside a batch."""
+        result = self.queue(command)
+        if not result.done():
+            self.flush()
+        return result
+
+    def flush(self) -> list[CommandResult]:
+        """Writes all queued commands at once, then reads their responses"""
+        batch, self.pending = self.pending, []
+        if not batch:
+            return batch
+        if self.lost:
+            for result in batch:
+                result.resolve(Response(-5))
+            return batch
+        payload = "".join(f"{result.command}\n" for result in batch)
+        stats.record_round_trip(len(batch))
+        start = time.perf_counter()
         try:
-            res = sendCommand(sock, command)
-            return [response, res.split()[1]]
+            self.sock.sendall(payload.encode())
         except Exception as e:
-            print(f"Error disconnectingEffects {e}: Result: {res}")
-            return -5
-
-
-def connectStereoToMono(sock, source_out_1, source_out_2, dest):
-    command = f"connect {source_out_1} {dest}"
-    try:
-        response = sendCommand(sock, command).split()[1]
-    except Exception as e:
-        print(f"Error connectingEffects {e}")
-        return -5
-
-    command = f"connect {source_out_2} {dest}"
-    try:
-        return [response, sendCommand(sock, command).split()[1]]
-    except Exception as e:
-        print(f"Error connectingEffects {e}")
-        return -5
-
-
-def connectSystemCapturMono(sock, dest):
-    command = f"connect system:capture_1 {dest}"
-    res = ""
-    try:
-        res = sendCommand(sock, command)
-        response = res.split()[1]
-    except Exception as e:
-        print(f"Error connectingEffects {e}. Result: {res}")
-        return -5
-
-    command = f"connect system:capture_2 {dest}"
-    try:
-        res = sendCommand(sock, command)
-        return [response, res.split()[1]]
-    except Exception as e:
-        print(f"Error connectingEffects {e}. Result: {res}")
-        return -5
-
-
-def connectSystemCapturStereo(sock, dest_in_1, dest_in_2):
-    command = f"connect system:capture_1 {dest_in_1}"
-    res = ""
-    try:
-        res = sendCommand(sock, command)
-        response = res.split()[1]
-    except Exception as e:
-        print(f"Error connectingEffects {e}. Result: {res}")
-        return -5
-
-    command = f"connect system:capture_2 {dest_in_2}"
-    try:
-        res = sendCommand(sock, command)
-        return [response, res.split()[1]]
-    except Exception as e:
-        print(f"Error connectingEffects {e}. Result: {res}")
-        return -5
+            print(f"Failed to send command: {e}")
+            self.lost = isinstance(e, OSError)
+            for result in batch:
+                result.resolve(Response(-5))
+                stats.record(result.command, 0.0, -5)
+            return batch
+
+        for i, result in enumerate(batch):
+            try:
+                result.resolve(self.reader.read())
+                stats.record(result.command,
+                             (time.perf_counter() - start) * 1000, result.code)
+            except socket.timeout:
+                print(f"Socket timeout for command: {result.command}")
+                # Late replies to these would otherwise shift onto the next
+                # batch's commands
+                self.reader.skip(len(batch) - i)
+                for late in batch[i:]:
+                    late.resolve(Response(-5))
+                    stats.record_timeout(late.command)
+                break
+            except Exception as e:
+                print(f"Failed to read response: {e}")
+                self.lost = isinstance(e, OSError)
+                for lost in batch[i:]:
+                    lost.resolve(Response(-5))
+                    stats.record(lost.command, 0.0, -5)
+                break
+            if result.response.raw and result.code == -5:
+                print(f"MODHOST-COMMAND ERROR:\n\tCOMMAND: {result.command}"
+                      f"\n\tOUTPUT: {result.response.raw}")
+        return batch
+
+    def close(self):
+        self.sock.close()
+
+
+def _pair(client, verb: str, pairs):
+    """Queues a connect/disconnect for every (source, dest) pair as one
+    batch"""
+    with client.batch():
+        return [client.queue(f"{verb} {source} {dest}")
+                for source, dest in pairs]
+
+
+def parameterCommand(instanceNum, parameter: plugin_manager.Parameter,
+                     value: float = None) -> str | None:
+    """Builds the set command for a parameter, None for unknown types"""
+    if value is None:
+        value = parameter.value
+    match parameter.type:
+        case "lv2":
+            return f"param_set {instanceNum} {parameter.symbol} {value}"
+        case "plug":
+            return f"patch_set {instanceNum} {parameter.symbol} {value}"
+    return None
 
 
-def disconnectSystemCapturStereo(sock, dest_in_1, dest_in_2):
-    command = f"disconnect system:capture_1 {dest_in_1}"
-    res = ""
-    try:
-        res = sendCommand(sock, command)
-        response = res.split()[1]
-    except Exception as e:
-        print(f"Error disconnectingEffects {e}. Result: {res}")
-        return -5
+def setParameters(client, updates):
+    """Sends (instanceNum, parameter, value) updates as one batch. Returns the
+    updates that mod-host rejected"""
+    with client.batch():
+        sent = []
+        for instanceNum, parameter, value in updates:
+            command = parameterCommand(instanceNum, parameter, value)
+            if command is not None:
+                sent.append((instanceNum, parameter, client.queue(command)))
+    return [(instanceNum, parameter) for instanceNum, parameter, result
+            in sent if result.code != 0]
+
+
+def updateBypass(client, instanceNum, plugin: plugin_manager.Plugin):
+    return client.queue(f"bypass {instanceNum} {plugin.bypass}")
+
+
+def applyParameters(client, nodes, readBack: bool = False):
+    """Sets every parameter of the (instanceNum, plugin) nodes in one batch.
+    With readBack each lv2 parameter is also read back with param_get in the
+    same batch and has to match; patch_set parameters can't be read back.
+    Returns the (plugin name, parameter name) pairs that failed"""
+    with client.batch():
+        sent = []
+        for instanceNum, plugin in nodes:
+            for parameter in plugin.parameters:
+                command = parameterCommand(instanceNum, parameter)
+                if command is None:
+                    continue
+                result = client.queue(command)
+                check = None
+                if readBack and parameter.type == "lv2":
+                    check = client.queue(
+                        f"param_get {instanceNum} {parameter.symbol}")
+                sent.append((plugin, parameter, result, check))
 
-    command = f"disconnect system:capture_2 {dest_in_2}"
-    try:
-        res = sendCommand(sock, command)
-        return [response, res.split()[1]]
-    except Exception as e:
-        print(f"Error disconnectingEffects {e}. Result: {res}")
-        return -5
+    badParameters = []
+    for plugin, parameter, result, check in sent:
+        failed = result.code != 0
+        if check is not None and not failed:
+            failed = (check.code != 0 or not isinstance(check.value, float)
+                      or abs(check.value - float(parameter.value)) > 1e-4)
+        if failed:
+            badParameters.append((plugin.name, parameter.name))
+    return badParameters
 
 
-def connectSystemPlaybackStereo(sock, source_out_1, source_out_2):
-    command = f"connect {source_out_1} system:playback_1"
-    res = ""
-    try:
-        res = sendCommand(sock, command)
-        response = res.split()[1]
-    except Exception as e:
-        print(f"Error connectingEffects {e}. Result {res}")
-        return -5
+def failedParameters(nodes, failed) -> list[tuple[str, str]]:
+    """The (plugin name, parameter name) pairs of the applyDiff failures that
+    set a parameter or bypass ("bypass") on the (instanceNum, plugin) nodes"""
+    plugins = dict(nodes)
+    badParameters = []
+    for command, _ in failed:
+        verb, *args = command.split(" ")
+        if verb not in ("param_set", "patch_set", "bypass"):
+            continue
+        plugin = plugins.get(int(args[0]))
+        if plugin is None:
+            continue
+        name = "bypass"
+        if verb != "bypass":
+            name = next((parameter.name for parameter in plugin.parameters
+                         if parameter.symbol == args[1]), args[1])
+        badParameters.append((plugin.name, name))
+    return badParameters
 
-    command = f"connect {source_out_2} system:playback_2"
-    try:
-        res = sendCommand(sock, command)
-        return [response, res.split()[1]]
-    except Exception as e:
-        print(f"Error connectingEffects {e}. Result {res}")
-        return -5
 
+def outputDataReady(client):
+    """Tells mod-host we handled its last feedback burst and want more"""
+    return client.queue("output_data_ready")
 
-def disconnectSystemPlaybackStereo(sock, source_out_1, source_out_2):
-    command = f"disconnect {source_out_1} system:playback_1"
-    res = ""
-    try:
-        res = sendCommand(sock, command)
-        response = res.split()[1]
-    except Exception as e:
-        print(f"Error connectingEffects {e}. Result {res}")
-        return -5
 
-    command = f"disconnect {source_out_2} system:playback_2"
-    try:
-        res = sendCommand(sock, command)
-        return [response, res.split()[1]]
-    except Exception as e:
-        print(f"Error connectingEffects {e}. Result {res}")
-        return -5
+def cpuLoad(client) -> float | None:
+    """mod-host's DSP load in percent, None if it didn't answer"""
+    if client is None:
+        return None
+    result = client.send("cpu_load")
+    if result.code != 0 or not isinstance(result.value, float):
+        return None
+    return result.value
 
 
-def connectSystemPlaybackMono(sock, source):
-    command = f"connnect {source} system:playback_1"
-    res = ""
-    try:
-        res = sendCommand(sock, command)
-        response = res.split()[1]
-    except Exception as e:
-        print(f"Error connectingEffects {e}. Result: {res}")
-        return -5
-
-    command = f"connect {source} system:playback_2"
-    res = sendCommand(sock, command)
-    try:
-        return [response, res.split()[1]]
-    except Exception as e:
-        print(f"Error connectingEffects {e}. Result: {res}")
-        return -5
+def parseFeedback(message: str) -> tuple | None:
+    """Parses a feedback port message into (event, instanceNum, symbol, value)
+    for param_set/output_set, (event,) for anything else without arguments,
+    or None if it can't be parsed"""
+    tokens = message.split()
+    if not tokens:
+        return None
+    match tokens[0]:
+        case "param_set" | "output_set":
+            try:
+                return (tokens[0], int(tokens[1]), tokens[2], float(tokens[3]))
+            except (IndexError, ValueError):
+                return None
+    return (tokens[0],)
 
 
-def updateParameter(sock, instanceNum, parameter: plugin_manager.Parameter) -> int:
-    if (parameter.type == "lv2"):
-        command = f"param_set {instanceNum} {parameter.symbol} {parameter.value}"
-        try:
-            res = sendCommand(sock, command)
-            return int(res.split()[1])
-        except Exception as e:
-            print(f"param_set error: {e}")
-            return -5
-    if (parameter.type == "plug"):
-        command = f"patch_set {instanceNum} {parameter.symbol} {parameter.value}"
-        try:
-            res = sendCommand(sock, command)
-            return int(res.split()[1])
-        except Exception as e:
-            print(f"patch_set error: {e}")
-            return -5
-    return -1
+def patchThrough(client):
+    """Connects system in to system out"""
+    return _pair(client, "connect", [(SYSIN1, SYSOUT1), (SYSIN2, SYSOUT2)])
 
 
-def updateBypass(sock, instanceNum, plugin: plugin_manager.Plugin):
-    command = f"bypass {instanceNum} {plugin.bypass}"
-    try:
-        return sendCommand(sock, command).split()[1]
-    except Exception as e:
-        print(f"Error updatingBypass {e}")
-        return -5
-
-
-def setUpPlugins(sock, manager: plugin_manager.PluginManager):
-    added = 0
-    for instanceNum, plugin in enumerate(manager.plugins):
-        response = addEffect(sock, plugin, instanceNum)
-        if (response != instanceNum):
-            print(instanceNum)
-            print(response)
-            print(f"Error adding plugins starting at: {plugin.name}.")
-            if response == -101:
-                print("mod-host responded -101: ERR_LV2_INVALID_URI. Is plugin installed?")
-            return -5
-        else:
-            print(f"added {plugin.name}")
-            added += 1
-    return added
-
-
-def setUpPatch(sock, manager: plugin_manager.PluginManager):
-    prev = None
-    for instanceNum, plugin in enumerate(manager.plugins):
-        if instanceNum == 0:  # CONNECT INPUT TO FIRST PLUGIN
-            if (plugin.channels == "mono"):
-                connectSystemCapturMono(
-                        sock,
-                        f"effect_{instanceNum}:{plugin.inputs[0]}"
-                )
-            elif (plugin.channels == "stereo"):
-                connectSystemCapturStereo(
-                        sock,
-                        f"effect_{instanceNum}:{plugin.inputs[0]}",
-                        f"effect_{instanceNum}:{plugin.inputs[1]}"
-                )
-            else:
-                print(f"Error in plugin JSON {plugin.name}. Invalid channel type: {plugin.channels}")
-                return -5
-        if instanceNum == len(manager.plugins) - 1:  # CONNECT LAST PLUGIN TO OUT
-            if (plugin.channels == "mono"):
-                connectSystemPlaybackMono(sock, f"effect_{instanceNum}:{plugin.outputs[0]}")
-            elif (plugin.channels == "stereo"):
-                connectSystemPlaybackStereo(sock, f"effect_{instanceNum}:{plugin.outputs[0]}", f"effect_{instanceNum}:{plugin.outputs[1]}")
-            else:
-                print(f"Error in plugin JSON {plugin.name}. Invalid channel type: {plugin.channels}")
-                return -5
-        if prev is not None:  # CONNECT ALL OTHER PLUGINS
-            if (plugin.channels == "mono"):
-                connectMonoToMono(
-                    sock,
-                    f"effect_{instanceNum-1}:{prev.outputs[0]}",
-                    f"effect_{instanceNum}:{plugin.inputs[0]}"
-                )
-            elif (plugin.channels == "stereo"):
-                connectStereoToStereo(
-                    sock,
-                    f"effect_{instanceNum-1}:{prev.outputs[0]}",
-                    f"effect_{instanceNum-1}:{prev.outputs[1]}",
-                    f"effect_{instanceNum}:{plugin.inputs[0]}",
-                    f"effect_{instanceNum}:{plugin.inputs[1]}"
-                )
-            else:
-                print(f"Error in plugin JSON {plugin.name}. Invalid channel type: {plugin.channels}")
-                return -5
-        prev = plugin
-
-
-def verifyParameters(sock, manager: plugin_manager.PluginManager):
-    badParameters = []
-    for instanceNum, plugin in enumerate(manager.plugins):
-        for instanceNumP, parameter in enumerate(plugin.parameters):
-            val = updateParameter(sock, instanceNum, parameter)
-            if (val != 0):
-                badParameters.append((plugin.name, parameter.name))
-            time.sleep(.1)
-
-    return badParameters
+# add failures mod-host gives again however often it is asked, e.g. for a
+# plugin that isn't installed
+NOT_LOADABLE = (-4, -101, -102)
 
 
-def tryCommand(sock, command, errMsg: str = ""):
-    cmdout = ""
+def commandInstances(command: str) -> set[int]:
+    """The instanceNums a mod-host command is about"""
+    verb, *args = command.split(" ")
+    if verb in ("connect", "disconnect"):
+        return {int(port[len("effect_"):].partition(":")[0])
+                for port in args if port.startswith("effect_")}
+    if verb == "add":
+        args = args[1:]
     try:
-        cmdout = sendCommand(sock, command)
-        return cmdout.split()[1]
-    except Exception as e:
-        print(f"MODHOST-COMMAND ERROR:\n\tEXCEPTION: {e}\n\tCOMMAND: {command} \n\tOUTPUT: {cmdout}\n\t{errMsg}")
-        return -5
-
-
-def patchThrough(sock):
-    """Connects system in to system out"""
-    tryCommand(sock, f"connect {SYSIN1} {SYSOUT1}")
-    tryCommand(sock, f"connect {SYSIN2} {SYSOUT2}")
-
-
-def unpatchThrough(sock):
-    """Disconnects system in and system out"""
-    tryCommand(sock, f"disconnect {SYSIN1} {SYSOUT1}")
-    tryCommand(sock, f"disconnect {SYSIN2} {SYSOUT2}")
-
-
-def remove(sock, instanceNum: int):
-    """Helper function to remove plugins"""
-    command = f"remove {instanceNum}"
-    tryCommand(sock, command)
-
-
-def removeFirst(sock, rmInstanceNum: int, rmPlugin: plugin_manager.Plugin,
-                nextInstanceNum: int, nextPlugin: plugin_manager.Plugin):
-    """Removes the first plugin. Note that the first instanceNum isn't always
-    0 due to re-ordering and adding"""
-    remove(sock, rmInstanceNum)
-    connectSystemCapturStereo(
-            sock,
-            f"effect_{nextInstanceNum}:{nextPlugin.inputs[0]}",
-            f"effect_{nextInstanceNum}:{nextPlugin.inputs[1]}"
-    )
-
-
-def removeMiddle(sock, rmInstanceNum: int, rmPlugin: plugin_manager.Plugin,
-                 prevInstanceNum: int, prevPlugin: plugin_manager.Plugin,
-                 nextInstanceNum: int, nextPlugin: plugin_manager.Plugin):
-    """General use case for removing plugin. Not first or last plugin"""
-    remove(sock, rmInstanceNum)
-    connectStereoToStereo(
-            sock,
-            f"effect_{prevInstanceNum}:{prevPlugin.outputs[0]}",
-            f"effect_{prevInstanceNum}:{prevPlugin.outputs[1]}",
-            f"effect_{nextInstanceNum}:{nextPlugin.inputs[0]}",
-            f"effect_{nextInstanceNum}:{nextPlugin.inputs[1]}"
-    )
-
-
-def removeLast(sock, rmInstanceNum: int, rmPlugin: plugin_manager.Plugin,
-               prevInstanceNum: int, prevPlugin: plugin_manager.Plugin):
-    """Removes the final plugin. Patches previous to system out."""
-    remove(sock, rmInstanceNum)
-    connectSystemPlaybackStereo(
-            sock,
-            f"effect_{prevInstanceNum}:{prevPlugin.outputs[0]}",
-            f"effect_{prevInstanceNum}:{prevPlugin.outputs[1]}"
-    )
-
-
-def removeFinal(sock, instanceNum: int):
-    """Removes final plugin. Patches system in to system out"""
-    remove(sock, instanceNum)
-    patchThrough(sock)
-
-
-def add_plugin_end(sock, newInstanceNum: int, newPlugin: plugin_manager.Plugin,
-                   lastInstanceNum: int, lastPlugin: plugin_manager.Plugin):
-    """Adds a plugin at the end of the chain."""
-    addEffect(sock, newPlugin, newInstanceNum)
-    if lastInstanceNum < 0:  # Handle adding first plugin
-        unpatchThrough(sock)
-        connectSystemCapturStereo(
-                sock,
-                f"effect_{newInstanceNum}:{newPlugin.inputs[0]}",
-                f"effect_{newInstanceNum}:{newPlugin.inputs[1]}"
-        )
-    else:
-        disconnectSystemPlaybackStereo(
-                sock,
-                f"effect_{lastInstanceNum}:{lastPlugin.outputs[0]}",
-                f"effect_{lastInstanceNum}:{lastPlugin.outputs[1]}"
-        )
-    connectStereoToStereo(
-            sock,
-            f"effect_{lastInstanceNum}:{lastPlugin.outputs[0]}",
-            f"effect_{lastInstanceNum}:{lastPlugin.outputs[1]}",
-            f"effect_{newInstanceNum}:{newPlugin.inputs[0]}",
-            f"effect_{newInstanceNum}:{newPlugin.inputs[1]}"
-    )
-    connectSystemPlaybackStereo(
-            sock,
-            f"effect_{newInstanceNum}:{newPlugin.outputs[0]}",
-            f"effect_{newInstanceNum}:{newPlugin.outputs[1]}"
-    )
-
-
-def swap_plugins_start(sock, instanceNumA: int, pluginA: plugin_manager.Plugin,
-                       instanceNumB: int, pluginB: plugin_manager.Plugin,
-                       afterInstanceNum: int, afterPlugin: plugin_manager.Plugin):
-    """Swaps the two plugins at the start of the chain.
-    Start state: SYSIN -> pluginA -> pluginB -> afterPlugin
-    End state: SYSIN -> pluginB -> pluginA -> afterPlugin
-    """
-    # disconnect all
-    disconnectSystemCapturStereo(
-            sock,
-            f"effect_{instanceNumA}:{pluginA.inputs[0]}",
-            f"effect_{instanceNumA}:{pluginA.inputs[1]}",
-    )
-    disconnectStereoToStereo(
-            sock,
-            f"effect_{instanceNumA}:{pluginA.outputs[0]}",
-            f"effect_{instanceNumA}:{pluginA.outputs[1]}",
-            f"effect_{instanceNumB}:{pluginB.inputs[0]}",
-            f"effect_{instanceNumB}:{pluginB.inputs[1]}",
-    )
-    disconnectStereoToStereo(
-            sock,
-            f"effect_{instanceNumB}:{pluginB.outputs[0]}",
-            f"effect_{instanceNumB}:{pluginB.outputs[1]}",
-            f"effect_{afterInstanceNum}:{afterPlugin.inputs[0]}",
-            f"effect_{afterInstanceNum}:{afterPlugin.inputs[1]}",
-    )
-    # reconnect
-    connectSystemCapturStereo(
-            sock,
-            f"effect_{instanceNumB}:{pluginB.inputs[0]}",
-            f"effect_{instanceNumB}:{pluginB.inputs[1]}",
-    )
-    connectStereoToStereo(
-            sock,
-            f"effect_{instanceNumB}:{pluginB.outputs[0]}",
-            f"effect_{instanceNumB}:{pluginB.outputs[1]}",
-            f"effect_{instanceNumA}:{pluginA.inputs[0]}",
-            f"effect_{instanceNumA}:{pluginA.inputs[1]}",
-    )
-    connectStereoToStereo(
-            sock,
-            f"effect_{instanceNumA}:{pluginA.outputs[0]}",
-            f"effect_{instanceNumA}:{pluginA.outputs[1]}",
-            f"effect_{afterInstanceNum}:{afterPlugin.inputs[0]}",
-            f"effect_{afterInstanceNum}:{afterPlugin.inputs[1]}",
-    )
-
-
-def swap_plugins_end(sock, instanceNumA: int, pluginA: plugin_manager.Plugin,
-                     instanceNumB: int, pluginB: plugin_manager.Plugin,
-                     beforeInstanceNum: int, beforePlugin: plugin_manager.Plugin):
-    """Swaps the two plugins at the end of the chain
-    Start state: beforePlugin -> pluginA -> pluginB -> SYSOUT
-    End state: beforePlugin -> pluginB -> pluginA -> SYSOUT
-    """
-    # disconnect all
-    disconnectStereoToStereo(
-            sock,
-            f"effect_{beforeInstanceNum}:{beforePlugin.outputs[0]}",
-            f"effect_{beforeInstanceNum}:{beforePlugin.outputs[1]}",
-            f"effect_{instanceNumA}:{pluginA.inputs[0]}",
-            f"effect_{instanceNumA}:{pluginA.inputs[1]}"
-    )
-    disconnectStereoToStereo(
-            sock,
-            f"effect_{instanceNumA}:{pluginA.outputs[0]}",
-            f"effect_{instanceNumA}:{pluginA.outputs[1]}",
-            f"effect_{instanceNumB}:{pluginB.inputs[0]}",
-            f"effect_{instanceNumB}:{pluginB.inputs[1]}",
-    )
-    disconnectSystemPlaybackStereo(
-            sock,
-            f"effect_{instanceNumB}:{pluginB.outputs[0]}",
-            f"effect_{instanceNumB}:{pluginB.outputs[1]}",
-    )
-    # reconnect
-    connectStereoToStereo(
-            sock,
-            f"effect_{beforeInstanceNum}:{beforePlugin.outputs[0]}",
-            f"effect_{beforeInstanceNum}:{beforePlugin.outputs[1]}",
-            f"effect_{instanceNumB}:{pluginB.inputs[0]}",
-            f"effect_{instanceNumB}:{pluginB.inputs[1]}",
-    )
-    connectStereoToStereo(
-            sock,
-            f"effect_{instanceNumB}:{pluginB.outputs[0]}",
-            f"effect_{instanceNumB}:{pluginB.outputs[1]}",
-            f"effect_{instanceNumA}:{pluginA.inputs[0]}",
-            f"effect_{instanceNumA}:{pluginA.inputs[1]}",
-    )
-    connectSystemPlaybackStereo(
-            sock,
-            f"effect_{instanceNumA}:{pluginA.outputs[0]}",
-            f"effect_{instanceNumA}:{pluginA.outputs[1]}",
-    )
-
-
-def swap_plugins_middle(sock, instanceNumA: int, pluginA: plugin_manager.Plugin,
-                        instanceNumB: int, pluginB: plugin_manager.Plugin,
-                        beforeInstanceNum: int, beforePlugin: plugin_manager.Plugin,
-                        afterInstanceNum: int, afterPlugin: plugin_manager.Plugin):
-    """Swaps any two plugins not at the start or the end of the chain
-    Start state: beforePlugin -> pluginA -> pluginB -> afterPlugin
-    End state: beforePlugin -> pluginB -> pluginA -> afterPlugin
-    """
-    # disconnect all
-    disconnectStereoToStereo(
-            sock,
-            f"effect_{beforeInstanceNum}:{beforePlugin.outputs[0]}",
-            f"effect_{beforeInstanceNum}:{beforePlugin.outputs[1]}",
-            f"effect_{instanceNumA}:{pluginA.inputs[0]}",
-            f"effect_{instanceNumA}:{pluginA.inputs[1]}"
-    )
-    disconnectStereoToStereo(
-            sock,
-            f"effect_{instanceNumA}:{pluginA.outputs[0]}",
-            f"effect_{instanceNumA}:{pluginA.outputs[1]}",
-            f"effect_{instanceNumB}:{pluginB.inputs[0]}",
-            f"effect_{instanceNumB}:{pluginB.inputs[1]}",
-    )
-    disconnectStereoToStereo(
-            sock,
-            f"effect_{instanceNumB}:{pluginB.outputs[0]}",
-            f"effect_{instanceNumB}:{pluginB.outputs[1]}",
-            f"effect_{afterInstanceNum}:{afterPlugin.inputs[0]}",
-            f"effect_{afterInstanceNum}:{afterPlugin.inputs[1]}",
-    )
-    # reconnect
-    connectStereoToStereo(
-            sock,
-            f"effect_{beforeInstanceNum}:{beforePlugin.outputs[0]}",
-            f"effect_{beforeInstanceNum}:{beforePlugin.outputs[1]}",
-            f"effect_{instanceNumB}:{pluginB.inputs[0]}",
-            f"effect_{instanceNumB}:{pluginB.inputs[1]}"
-    )
-    connectStereoToStereo(
-            sock,
-            f"effect_{instanceNumB}:{pluginB.outputs[0]}",
-            f"effect_{instanceNumB}:{pluginB.outputs[1]}",
-            f"effect_{instanceNumA}:{pluginA.inputs[0]}",
-            f"effect_{instanceNumA}:{pluginA.inputs[1]}",
-    )
-    connectStereoToStereo(
-            sock,
-            f"effect_{instanceNumA}:{pluginA.outputs[0]}",
-            f"effect_{instanceNumA}:{pluginA.outputs[1]}",
-            f"effect_{afterInstanceNum}:{afterPlugin.inputs[0]}",
-            f"effect_{afterInstanceNum}:{afterPlugin.inputs[1]}",
-    )
-
-
-def swap_plugins_final(sock, instanceNumA: int, pluginA: plugin_manager.Plugin,
-                       instanceNumB: int, pluginB: plugin_manager.Plugin):
-    """Swaps the remaining two plugins in a chain
-    Start state: SYSIN -> pluginA -> pluginB -> SYSOUT
-    End state: SYSIN -> pluginB -> pluginA -> SYSOUT
-    """
-    # disconnect all
-    disconnectSystemCapturStereo(
-            sock,
-            f"effect_{instanceNumA}:{pluginA.inputs[0]}",
-            f"effect_{instanceNumA}:{pluginA.inputs[1]}"
-    )
-    disconnectStereoToStereo(
-            sock,
-            f"effect_{instanceNumA}:{pluginA.outputs[0]}",
-            f"effect_{instanceNumA}:{pluginA.outputs[1]}",
-            f"effect_{instanceNumB}:{pluginB.inputs[0]}",
-            f"effect_{instanceNumB}:{pluginB.inputs[1]}",
-    )
-    disconnectSystemPlaybackStereo(
-            sock,
-            f"effect_{instanceNumB}:{pluginB.outputs[0]}",
-            f"effect_{instanceNumB}:{pluginB.outputs[1]}",
-    )
-    # reconnect
-    connectSystemPlaybackStereo(
-            sock,
-            f"effect_{instanceNumB}:{pluginB.inputs[0]}",
-            f"effect_{instanceNumB}:{pluginB.inputs[1]}"
-    )
-    connectStereoToStereo(
-            sock,
-            f"effect_{instanceNumB}:{pluginB.outputs[0]}",
-            f"effect_{instanceNumB}:{pluginB.outputs[1]}",
-            f"effect_{instanceNumA}:{pluginA.inputs[0]}",
-            f"effect_{instanceNumA}:{pluginA.inputs[1]}",
-    )
-    connectSystemPlaybackStereo(
-            sock,
-            f"effect_{instanceNumA}:{pluginA.outputs[0]}",
-            f"effect_{instanceNumA}:{pluginA.outputs[1]}",
-    )
+        return {int(args[0])}
+    except (IndexError, ValueError):
+        return set()
+
+
+def missingInstances(failed) -> set[int]:
+    """The instanceNums of the applyDiff failures that are adds of a plugin
+    mod-host can't load"""
+    return {instanceNum for command, code in failed
+            if command.startswith("add ") and code in NOT_LOADABLE
+            for instanceNum in commandInstances(command)}
+
+
+def driftFailures(failed, missing=()) -> list[tuple[str, int]]:
+    """The applyDiff failures that leave mod-host's graph different from the
+    GUI's: a remove, connect or disconnect that didn't take, an add that
+    failed for any other reason than the plugin not loading, or a command
+    that got no response. Failures on the missing instances, which mod-host
+    never had, are left out"""
+    drift = []
+    for command, code in failed:
+        if commandInstances(command) & set(missing):
+            continue
+        verb = command.split(" ", 1)[0]
+        if (code == -5 or verb in ("remove", "connect", "disconnect")
+                or (verb == "add" and code not in NOT_LOADABLE)):
+            drift.append((command, code))
+    return drift
+
+
+def applyDiff(client, commands: list[str]) -> list[tuple[str, int]]:
+    """Sends the commands from PedalGraph.diff in one batch. Returns the
+    (command, code) pairs mod-host rejected"""
+    with client.batch():
+        results = [client.queue(command) for command in commands]
+    failed = []
+    for result in results:
+        # add answers with the new instanceNum
+        ok = result.code >= 0 if result.command.startswith("add ") else result.code == 0
+        if not ok:
+            failed.append((result.command, result.code))
+    return failed
@@ -1,7 +1,7 @@
 """Manages offboard (USB) configuration loading"""
 import fs
 import fs.base
-import os
+import getpass
 from utils import config_dir, root_dir
 import time
 
@@ -11,7 +11,8 @@ SCAN_FOR_DIR: str = "multifx"
 MOCK = False
 
 # USB directory and fallbacks
-USB_DIRS = [f"/run/media/{os.getlogin()}", f"/media/{os.getlogin()}"]
+# getlogin() fails without a controlling terminal (autostart, ssh, cron)
+USB_DIRS = [f"/run/media/{getpass.getuser()}", f"/media/{getpass.getuser()}"]
 if MOCK:
     USB_DIRS = [f"{root_dir}/.mockdev"]
 
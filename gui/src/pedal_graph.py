@@ -0,0 +1,240 @@
+"""The pedalboard as a graph of plugin instances and jack connections"""
+
+from plugin_manager import Plugin
+from modhostmanager import SYSIN1, SYSIN2, SYSOUT1, SYSOUT2, parameterCommand
+
+# System ports are stereo endpoints like any stereo plugin
+CAPTURE = [SYSIN1, SYSIN2]
+PLAYBACK = [SYSOUT1, SYSOUT2]
+# Stands in for the instanceNum in command templates. mod-host commands
+# can't contain it, NUL ends them.
+INSTANCE = "\x00"
+
+
+def pluginPorts(instanceNum: int, plugin: Plugin, ports: list) -> list[str]:
+    """The jack ports of a plugin that are wired, one for mono, two for stereo"""
+    count = 2 if plugin.channels == "stereo" else 1
+    return [f"effect_{instanceNum}:{port}" for port in ports[:count]]
+
+
+def monitorCommands(instanceNum, plugin: Plugin) -> list[str]:
+    """The commands having mod-host report the plugin's monitored output
+    ports on the feedback port"""
+    return [f"monitor_output {instanceNum} {symbol}"
+            for symbol in plugin.monitors]
+
+
+def setupCommands(instanceNum, plugin: Plugin) -> tuple[str, list[str]]:
+    """The command adding a plugin and the ones setting its parameters and
+    bypass and monitoring its outputs. With INSTANCE for instanceNum they are
+    templates for fill()."""
+    settings = monitorCommands(instanceNum, plugin)
+    for parameter in plugin.parameters:
+        command = parameterCommand(instanceNum, parameter)
+        if command is not None:
+            settings.append(command)
+    if plugin.bypass != 0:
+        settings.append(f"bypass {instanceNum} {plugin.bypass}")
+    return f"add {plugin.uri} {instanceNum}", settings
+
+
+def fill(setup: tuple[str, list[str]], instanceNum: int):
+    """setupCommands() templates for an actual instanceNum"""
+    add, settings = setup
+    num = str(instanceNum)
+    return (add.replace(INSTANCE, num),
+            [command.replace(INSTANCE, num) for command in settings])
+
+
+def linkPorts(sources: list[str], dests: list[str]) -> set[tuple[str, str]]:
+    """Pairs up left/right, or fans mono out to stereo and stereo into mono"""
+    if len(sources) == len(dests):
+        return set(zip(sources, dests))
+    return {(source, dest) for source in sources for dest in dests}
+
+
+class PedalGraph:
+    """Plugin instances wired in series from system capture to system playback.
+
+    The GUI changes a graph and sends mod-host the diff against the graph
+    before the change, so mod-host always mirrors the last graph sent to
+    it. Nodes are (instanceNum, plugin) in signal order and the edges
+    follow from them; an empty graph is patched straight through.
+    """
+
+    def __init__(self, nodes=None):
+        self.nodes: list[tuple[int, Plugin]] = list(nodes) if nodes else []
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def copy(self):
+        return PedalGraph(self.nodes)
+
+    def instances(self) -> list[int]:
+        return [instanceNum for instanceNum, _ in self.nodes]
+
+    def plugins(self) -> list[Plugin]:
+        return [plugin for _, plugin in self.nodes]
+
+    def allocate(self, reserved=()) -> int:
+        """Lowest instanceNum not used by this graph or in reserved"""
+        used = set(self.instances()) | set(reserved)
+        instanceNum = 0
+        while instanceNum in used:
+            instanceNum += 1
+        return instanceNum
+
+    def insert(self, position: int, plugin: Plugin,
+               instanceNum: int = None) -> int:
+        """Adds a plugin, on a new instance unless one is given. Returns its
+        instanceNum"""
+        if instanceNum is None:
+            instanceNum = self.allocate()
+        self.nodes.insert(position, (instanceNum, plugin))
+        return instanceNum
+
+    def append(self, plugin: Plugin, instanceNum: int = None) -> int:
+        return self.insert(len(self.nodes), plugin, instanceNum)
+
+    def remove(self, position: int) -> tuple[int, Plugin]:
+        return self.nodes.pop(position)
+
+    def swap(self, a: int, b: int):
+        self.nodes[a], self.nodes[b] = self.nodes[b], self.nodes[a]
+
+    def bridge(self, missing) -> tuple["PedalGraph", list[str]]:
+        """This graph without the missing instances, which mod-host never
+        added, and the connections wiring the chain around them. Nothing
+        could be connected to them, so none have to be disconnected."""
+        graph = PedalGraph([(instanceNum, plugin)
+                            for instanceNum, plugin in self.nodes
+                            if instanceNum not in missing])
+        return graph, [f"connect {source} {dest}"
+                       for source, dest in sorted(graph.edges() - self.edges())]
+
+    def edges(self) -> set[tuple[str, str]]:
+        edges = set()
+        sources = CAPTURE
+        for instanceNum, plugin in self.nodes:
+            edges |= linkPorts(
+                sources, pluginPorts(instanceNum, plugin, plugin.inputs))
+            sources = pluginPorts(instanceNum, plugin, plugin.outputs)
+        return edges | linkPorts(sources, PLAYBACK)
+
+    def rebuild(self, plugins: list[Plugin]):
+        """A graph for plugins that reuses this graph's instances running the
+        same URI. New instances never take a number this graph uses, so the
+        diff can add them before the old ones are removed."""
+        free: dict[str, list[int]] = {}
+        for instanceNum, plugin in self.nodes:
+            free.setdefault(plugin.uri, []).append(instanceNum)
+        graph = PedalGraph()
+        for plugin in plugins:
+            reusable = free.get(plugin.uri)
+            if reusable:
+                graph.nodes.append((reusable.pop(0), plugin))
+            else:
+                instanceNum = graph.allocate(self.instances())
+                graph.nodes.append((instanceNum, plugin))
+        return graph
+
+    def stage(self, plugins: list[Plugin]):
+        """A graph for plugins on instances this graph doesn't use, so it
+        can be built while this one keeps playing (see switchover)"""
+        graph = PedalGraph()
+        for plugin in plugins:
+            graph.nodes.append((graph.allocate(self.instances()), plugin))
+        return graph
+
+    def switchover(self, target, setup=None) -> tuple[list[str], list[str]]:
+        """Commands for a gapless switch to a target from stage().
+
+        The first list builds the target chain with all of its parameters
+        while this one keeps playing, then moves system capture and playback
+        over to it in one burst, connecting the new chain before the old one
+        is disconnected. The second list retires this graph's instances and
+        can be sent later. setup can hold the target nodes' setupCommands()
+        templates, e.g. from a compiled profile, to only be filled in.
+        """
+        oldEdges = self.edges()
+        newEdges = target.edges()
+        if setup is None:
+            setups = [setupCommands(num, plugin) for num, plugin in target.nodes]
+        else:
+            setups = [fill(template, num)
+                      for template, num in zip(setup, target.instances())]
+        commands = [add for add, _ in setups]
+        for _, settings in setups:
+            commands += settings
+        system = set(CAPTURE + PLAYBACK)
+        flip = {edge for edge in newEdges - oldEdges
+                if edge[0] in system or edge[1] in system}
+        commands += [f"connect {source} {dest}"
+                     for source, dest in sorted(newEdges - oldEdges - flip)]
+        commands += [f"connect {source} {dest}" for source, dest in sorted(flip)]
+        commands += [f"disconnect {source} {dest}"
+                     for source, dest in sorted(oldEdges - newEdges)
+                     if source in system or dest in system]
+        retire = [f"remove {num}" for num in self.instances()]
+        return commands, retire
+
+    def build(self) -> list[str]:
+        """Commands creating this graph on a fresh mod-host, which has no
+        plugins and nothing connected"""
+        return PedalGraph().diff(self, connected=set())
+
+    def diff(self, target, warm=(), connected=None) -> list[str]:
+        """mod-host commands turning this graph into target.
+
+        Instances in both graphs are kept and only get their changed
+        parameters and bypass, the rest are added or removed. Instances new
+        to the graph, warm ones too, get their outputs monitored. Only
+        connections that differ are touched. Old plugins are gone before
+        new connections are made so the two never play together. warm
+        instanceNums already exist in mod-host, unconnected and bypassed
+        (see warm_pool.py). connected overrides the connections mod-host
+        is assumed to have, this graph's edges by default.
+        """
+        current = dict(self.nodes)
+        wanted = dict(target.nodes)
+        removed = [num for num in current if num not in wanted]
+        removedPorts = tuple(f"effect_{num}:" for num in removed)
+
+        commands = [f"add {plugin.uri} {num}"
+                    for num, plugin in target.nodes
+                    if num not in current and num not in warm]
+        for num, plugin in target.nodes:
+            old = current.get(num)
+            oldValues = {}
+            if old is not None:
+                oldValues = {p.symbol: p.value for p in old.parameters}
+            else:
+                commands += monitorCommands(num, plugin)
+            for parameter in plugin.parameters:
+                if oldValues.get(parameter.symbol) == parameter.value:
+                    continue
+                command = parameterCommand(num, parameter)
+                if command is not None:
+                    commands.append(command)
+
+        oldEdges = self.edges() if connected is None else connected
+        newEdges = target.edges()
+        # Connections to removed instances go away with them
+        commands += [f"disconnect {source} {dest}"
+                     for source, dest in sorted(oldEdges - newEdges)
+                     if not (source.startswith(removedPorts)
+                             or dest.startswith(removedPorts))]
+        commands += [f"remove {num}" for num in removed]
+        commands += [f"connect {source} {dest}"
+                     for source, dest in sorted(newEdges - oldEdges)]
+
+        for num, plugin in target.nodes:
+            old = current.get(num)
+            if old is not None:
+                bypass = old.bypass
+            else:
+                bypass = 1 if num in warm else 0
+            if plugin.bypass != bypass:
+                commands.append(f"bypass {num} {plugin.bypass}")
+        return commands
@@ -1,16 +1,30 @@
 import json
 import os
+from array import array
+import lv2_scan
 from utils import config_dir
 
+# Modes that step by whole numbers, their values read back as ints
+DISCRETE_MODES = ("button", "selector")
+
+# Set MULTIFX_SCAN_LV2=0 to only offer the plugins in all_plugins.json
+SCAN_LV2 = os.environ.get("MULTIFX_SCAN_LV2", "1") not in ("", "0")
+
 
 class Parameter():
+    """A plugin control. Once added to a plugin its value lives in the
+    plugin's values array, at index."""
+    __slots__ = ("type", "name", "symbol", "mode", "minimum", "max",
+                 "increment", "values", "index")
+
     def __init__(self, type: str, name: str, symbol: str, mode: str,
                  value: float, min: float, max: float):
         self.type = type
         self.name = name
         self.symbol = symbol
         self.mode = mode
-        self.value = value
+        self.values = array("d", [value])
+        self.index = 0
         self.minimum = min
         self.max = max
         match self.mode:
@@ -19,14 +33,49 @@ class Parameter():
             case "button" | "selector":
                 self.increment = 1
 
+    @property
+    def value(self) -> float:
+        value = self.values[self.index]
+        return round(value) if self.mode in DISCRETE_MODES else value
+
+    @value.setter
+    def value(self, value: float):
+        self.values[self.index] = value
+
     def setValue(self, value: float):
-        self.value = value
+        self.values[self.index] = value
+
+    def copy(self, values: array = None):
+        """The same parameter reading its value from values, at the same
+        index, or keeping its own copy of the value"""
+        parameter = Parameter.__new__(Parameter)
+        parameter.type = self.type
+        parameter.name = self.name
+        parameter.symbol = self.symbol
+        parameter.mode = self.mode
+        parameter.minimum = self.minimum
+        parameter.max = self.max
+        if hasattr(self, "increment"):
+            parameter.increment = self.increment
+        if values is None:
+            parameter.values = array("d", [self.values[self.index]])
+            parameter.index = 0
+        else:
+            parameter.values = values
+            parameter.index = self.index
+        return parameter
 
 
 class Plugin():
+    """A plugin on a board or in the catalog. Parameter values are kept
+    together in one array, which makes copies and snapshots cheap."""
+    __slots__ = ("name", "uri", "bypass", "channels", "inputs", "outputs",
+                 "parameters", "values", "monitors", "outputValues")
+
     def __init__(self, name: str, uri: str, channels: str, inputs: list,
                  # WHY IS BYPASS A FLOAT >:(
-                 outputs: list, bypass: float = 0, paramters: list = None):
+                 outputs: list, bypass: float = 0, paramters: list = None,
+                 monitors: list = None):
         self.name = name
         self.uri = uri
         self.bypass = bypass
@@ -34,29 +83,63 @@ class Plugin():
         self.inputs = inputs
         self.outputs = outputs
         # initalize parameters if there are any otherwise initalize an empty list
-        self.parameters = paramters if paramters else []
+        self.parameters = []
+        self.values = array("d")
+        for parameter in paramters or []:
+            self.add_parameter(parameter)
+        # Control output ports mod-host reports the values of, e.g. meters
+        self.monitors = monitors or []
+        # Latest values of the monitored ports, by symbol
+        self.outputValues: dict[str, float] = {}
 
     def add_parameter(self, parameter: Parameter):
+        """Moves the parameter's value into this plugin's array"""
+        value = parameter.values[parameter.index]
+        parameter.values = self.values
+        parameter.index = len(self.values)
+        self.values.append(value)
         self.parameters.append(parameter)
 
+    def copy(self):
+        """A plugin with its own parameter values and output values. The
+        port lists are shared, nothing changes them."""
+        plugin = Plugin.__new__(Plugin)
+        plugin.name = self.name
+        plugin.uri = self.uri
+        plugin.bypass = self.bypass
+        plugin.channels = self.channels
+        plugin.inputs = self.inputs
+        plugin.outputs = self.outputs
+        plugin.monitors = self.monitors
+        plugin.values = array("d", self.values)
+        plugin.parameters = [parameter.copy(plugin.values)
+                             for parameter in self.parameters]
+        plugin.outputValues = dict(self.outputValues)
+        return plugin
+
+    def snapshot(self) -> tuple:
+        """Bypass and parameter values, for restore()"""
+        return self.bypass, array("d", self.values)
+
+    def restore(self, snapshot: tuple):
+        bypass, values = snapshot
+        self.bypass = bypass
+        # In place, the parameters read from this array
+        self.values[:] = values
+
 
 class PluginManager:
     def __init__(self, plugins: list = None):
         self.plugins = plugins if plugins else []
+        # (period, nperiods) to run jackd with, from the profile's "jack"
+        self.jack_config: tuple[int, int] | None = None
 
     def getPluginNames(self):
-        names = []
-        for plugin in self.plugins:
-            names.append(plugin.name)
-        return names
+        return [plugin.name for plugin in self.plugins]
 
     def getParameterNames(self, x: int):
         try:
-            names = []
-            for parameter in self.plugins[x].parameters:
-                names.append(parameter.name)
-
-            return names
+            return [parameter.name for parameter in self.plugins[x].parameters]
         except Exception as e:
             print(e)
             return []
@@ -77,6 +160,16 @@ class PluginManager:
     def addPlugin(self, plugin: Plugin):
         self.plugins.append(plugin)
 
+    def snapshot(self) -> list:
+        """The plugins in order with their bypass and parameter values, for
+        restore()"""
+        return [(plugin, plugin.snapshot()) for plugin in self.plugins]
+
+    def restore(self, snapshot: list):
+        self.plugins[:] = [plugin for plugin, _ in snapshot]
+        for plugin, state in snapshot:
+            plugin.restore(state)
+
     def changeParameter(self, pluginIndex: int, parameterIndex: int,
                         value: float):
         try:
@@ -94,10 +187,49 @@ class PluginManager:
             return None
 
     def all_plugins():
-        json_path = os.path.join(config_dir, "all_plugins.json")
-        mgr = PluginManager()
-        mgr.initFromJSON(json_path)
-        return mgr.plugins
+        """Fresh copies of every plugin in the catalog"""
+        return PluginCatalog.shared().copies()
+
+    def loadPlugins(self, plugins: list[dict]):
+        """Adds plugins described like in the JSON files. Raises ValueError
+        on one without a URI"""
+        for plugin_data in plugins:
+            name = plugin_data.get("name", "plugin")
+            if "uri" not in plugin_data:
+                raise ValueError("No uri included")
+            uri = plugin_data.get("uri")
+            bypass = plugin_data.get("bypass", 0)
+            channels = plugin_data.get("channels", "mono")
+            inputs = plugin_data.get("inputs", ["in"])
+            outputs = plugin_data.get("outputs", ["out"])
+            monitors = plugin_data.get("monitors", [])
+
+            parameters = []
+
+            for param_data in plugin_data.get("parameters", []):
+                try:
+                    parameter = Parameter(
+                        type=param_data.get("type", "lv2"),
+                        name=param_data.get("name", "parameter"),
+                        symbol=param_data["symbol"],
+                        mode=param_data.get("mode", "dial"),
+                        min=param_data["min"],
+                        max=param_data["max"],
+                        value=param_data.get("default", 1.0)
+                    )
+                    parameters.append(parameter)
+                except KeyError as e:
+                    print(f"Skipping parameter {name} due to missing key: {e}")
+            self.addPlugin(Plugin(
+                    name=name,
+                    uri=uri,
+                    bypass=bypass,
+                    channels=channels,
+                    inputs=inputs,
+                    outputs=outputs,
+                    paramters=parameters,
+                    monitors=monitors
+                ))
 
     def initFromJSON(self, jsonFile: str):
         try:
@@ -106,41 +238,14 @@ class PluginManager:
                 if "plugins" not in data:
                     raise ValueError("Missing 'plugins' field")
 
-                for plugin_data in data["plugins"]:
-                    name = plugin_data.get("name", "plugin")
-                    if "uri" not in plugin_data:
-                        raise ValueError("No uri included")
-                    uri = plugin_data.get("uri")
-                    bypass = plugin_data.get("bypass", 0)
-                    channels = plugin_data.get("channels", "mono")
-                    inputs = plugin_data.get("inputs", ["in"])
-                    outputs = plugin_data.get("outputs", ["out"])
-
-                    parameters = []
-
-                    for param_data in plugin_data.get("parameters", []):
-                        try:
-                            parameter = Parameter(
-                                type=param_data.get("type", "lv2"),
-                                name=param_data.get("name", "parameter"),
-                                symbol=param_data["symbol"],
-                                mode=param_data.get("mode", "dial"),
-                                min=param_data["min"],
-                                max=param_data["max"],
-                                value=param_data.get("default", 1.0)
-                            )
-                            parameters.append(parameter)
-                        except KeyError as e:
-                            print(f"Skipping parameter {name} due to missing key: {e}")
-                    self.addPlugin(Plugin(
-                            name=name,
-                            uri=uri,
-                            bypass=bypass,
-                            channels=channels,
-                            inputs=inputs,
-                            outputs=outputs,
-                            paramters=parameters
-                        ))
+                if "jack" in data:
+                    try:
+                        self.jack_config = (int(data["jack"]["period"]),
+                                            int(data["jack"]["nperiods"]))
+                    except (KeyError, TypeError, ValueError) as e:
+                        print(f"Ignoring invalid jack settings: {e}")
+
+                self.loadPlugins(data["plugins"])
 
         except json.JSONDecodeError:
             print("Invalid JSON format!")
@@ -150,3 +255,111 @@ class PluginManager:
             return -1
         except ValueError as e:
             print(f"JSON Error: {e}")
+
+
+class PluginCatalog:
+    """Every plugin that can be added to a board: the ones described in
+    all_plugins.json, then any other installed LV2 plugin (see lv2_scan.py).
+
+    The file is parsed once per process and again only when its mtime
+    changes, e.g. after a USB drive brought a new one. The LV2 bundles are
+    scanned once per process, which the GUI does on a thread and hands over
+    with setInstalled(); until then only the file's plugins are listed,
+    unless byUri() misses and scans right away. Plugins are indexed by name and URI. The
+    catalog's own plugins are templates and must not be changed; byName(),
+    byUri() and copies() hand out fresh ones.
+    """
+    instance = None
+
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(config_dir, "all_plugins.json")
+        self.mtime = None
+        self.plugins: list[Plugin] = []
+        self.names: dict[str, Plugin] = {}
+        self.uris: dict[str, Plugin] = {}
+        # Entries for the installed plugins, None until scanned
+        self.installed: list[dict] | None = None
+        # installed changed since the plugins were built
+        self.stale = False
+
+    def shared():
+        """The catalog shared by the whole process"""
+        if PluginCatalog.instance is None:
+            PluginCatalog.instance = PluginCatalog()
+        return PluginCatalog.instance
+
+    def refresh(self):
+        """Parses the file again if it changed since it was last read"""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime is not None and mtime == self.mtime and not self.stale:
+            return
+        manager = PluginManager()
+        manager.initFromJSON(self.path)
+        if self.stale:
+            self.checkInstalled(manager.plugins)
+            self.stale = False
+        described = {plugin.uri for plugin in manager.plugins}
+        try:
+            manager.loadPlugins([entry for entry in self.installed or []
+                                 if entry["uri"] not in described])
+        except ValueError as e:
+            print(f"LV2 cache error: {e}")
+        self.plugins = manager.plugins
+        # The first of plugins sharing a name or URI wins
+        self.names = {}
+        self.uris = {}
+        for plugin in self.plugins:
+            self.names.setdefault(plugin.name, plugin)
+            self.uris.setdefault(plugin.uri, plugin)
+        self.mtime = mtime
+
+    def setInstalled(self, entries: list[dict]):
+        """Takes the installed plugins from lv2_scan.scan(), unless they were
+        scanned already"""
+        if self.installed is not None:
+            return
+        self.installed = entries
+        self.stale = True
+
+    def scanInstalled(self):
+        """Scans the installed plugins now if that didn't happen yet"""
+        if self.installed is None:
+            self.setInstalled(lv2_scan.scan() if SCAN_LV2 else [])
+
+    def checkInstalled(self, plugins: list[Plugin]):
+        """Warns about described plugins mod-host won't find"""
+        if not self.installed:
+            return  # Nothing scanned, e.g. not on the pedal
+        uris = {entry["uri"] for entry in self.installed}
+        for plugin in plugins:
+            if plugin.uri not in uris:
+                print(f"{plugin.name} isn't installed: {plugin.uri}")
+
+    def templates(self) -> list[Plugin]:
+        """The catalog's plugins, not to be changed"""
+        self.refresh()
+        return self.plugins
+
+    def template(self, name: str) -> Plugin | None:
+        self.refresh()
+        return self.names.get(name)
+
+    def byName(self, name: str) -> Plugin | None:
+        plugin = self.template(name)
+        return plugin.copy() if plugin is not None else None
+
+    def byUri(self, uri: str) -> Plugin | None:
+        self.refresh()
+        plugin = self.uris.get(uri)
+        if plugin is None and self.installed is None:
+            # e.g. a journal adding a scanned plugin before the scan is done
+            self.scanInstalled()
+            self.refresh()
+            plugin = self.uris.get(uri)
+        return plugin.copy() if plugin is not None else None
+
+    def copies(self) -> list[Plugin]:
+        return [plugin.copy() for plugin in self.templates()]
@@ -0,0 +1,73 @@
+"""Profiles kept parsed and ready to load, so going back to one during a set
+doesn't read its JSON again"""
+
+import hashlib
+import os
+from plugin_manager import PluginManager
+from pedal_graph import INSTANCE, setupCommands
+from utils import config_dir
+
+
+class CompiledProfile:
+    """A parsed profile and the commands building it, with INSTANCE for
+    the instanceNums (see PedalGraph.switchover). Its plugins are templates,
+    board() hands out fresh ones."""
+
+    def __init__(self, manager: PluginManager, mtime: int, digest: str):
+        self.plugins = manager.plugins
+        self.jack_config = manager.jack_config
+        self.setup = [setupCommands(INSTANCE, plugin)
+                      for plugin in self.plugins]
+        self.mtime = mtime
+        self.digest = digest
+
+    def board(self) -> PluginManager:
+        board = PluginManager([plugin.copy() for plugin in self.plugins])
+        board.jack_config = self.jack_config
+        return board
+
+
+class ProfileCache:
+    """Compiled profiles by name.
+
+    A profile is compiled the first time it is loaded and again only when
+    its file changes: an unchanged mtime skips reading it at all, and a
+    touched file with the same content hash keeps the compiled form.
+    """
+    instance = None
+
+    def __init__(self, directory: str = config_dir):
+        self.directory = directory
+        self.profiles: dict[str, CompiledProfile] = {}
+
+    def shared():
+        """The cache shared by the whole process"""
+        if ProfileCache.instance is None:
+            ProfileCache.instance = ProfileCache()
+        return ProfileCache.instance
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory, name + ".json")
+
+    def get(self, name: str) -> CompiledProfile:
+        path = self.path(name)
+        compiled = self.profiles.get(name)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            if compiled is not None and compiled.mtime == mtime:
+                return compiled
+            with open(path, "rb") as file:
+                digest = hashlib.sha1(file.read()).hexdigest()
+        except OSError:
+            # Reported by initFromJSON
+            self.profiles.pop(name, None)
+            manager = PluginManager()
+            manager.initFromJSON(path)
+            return CompiledProfile(manager, None, None)
+        if compiled is not None and compiled.digest == digest:
+            compiled.mtime = mtime
+            return compiled
+        manager = PluginManager()
+        manager.initFromJSON(path)
+        compiled = self.profiles[name] = CompiledProfile(manager, mtime, digest)
+        return compiled
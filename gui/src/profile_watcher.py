@@ -0,0 +1,73 @@
+"""Notices profiles changing on disk while the GUI runs, e.g. after a USB
+import or an edit over SSH"""
+
+import os
+from PyQt5.QtCore import QFileSystemWatcher, QObject, QTimer, pyqtSignal
+from utils import config_dir
+
+
+class ProfileWatcher(QObject):
+    """Watches the profile JSONs with inotify (QFileSystemWatcher).
+
+    Editors save in several steps and often by replacing the file, which
+    drops the watch on it, so events only start a short timer. When it
+    fires the directory is listed and each profile's mtime compared with
+    the last seen, nothing is parsed here. changed has the name of each
+    profile whose file changed, listChanged fires when profiles come or go.
+    """
+    changed = pyqtSignal(str)
+    listChanged = pyqtSignal()
+    SETTLE_MS = 250
+
+    def __init__(self, directory: str = config_dir):
+        super().__init__()
+        self.directory = directory
+        self.mtimes = self.scan()
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.touched)
+        self.watcher.fileChanged.connect(self.touched)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.check)
+        self.watch()
+
+    def scan(self) -> dict[str, int]:
+        """Profile names and their files' mtimes"""
+        mtimes = {}
+        try:
+            names = os.listdir(self.directory)
+        except OSError as e:
+            print(f"Can't watch profiles: {e}")
+            return mtimes
+        for name in names:
+            if not name.endswith(".json") or "all_plugins" in name:
+                continue
+            try:
+                mtime = os.stat(os.path.join(self.directory, name)).st_mtime_ns
+            except OSError:
+                continue  # removed since listing
+            mtimes[name[:-len(".json")]] = mtime
+        return mtimes
+
+    def watch(self):
+        """Watches the directory and any profile not watched yet"""
+        paths = [self.directory] + [
+            os.path.join(self.directory, name + ".json")
+            for name in self.mtimes]
+        watched = set(self.watcher.directories() + self.watcher.files())
+        missing = [path for path in paths if path not in watched]
+        if missing:
+            self.watcher.addPaths(missing)
+
+    def touched(self, path: str):
+        self.timer.start(self.SETTLE_MS)
+
+    def check(self):
+        mtimes = self.scan()
+        old, self.mtimes = self.mtimes, mtimes
+        self.watch()
+        if mtimes.keys() != old.keys():
+            self.listChanged.emit()
+        for name, mtime in sorted(mtimes.items()):
+            if name in old and old[name] != mtime:
+                self.changed.emit(name)
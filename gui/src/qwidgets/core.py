@@ -1,34 +1,72 @@
 """Core widgets for the MultiFX GUI"""
 
 import os
-from PyQt5.QtWidgets import QWidget, QStackedWidget, QVBoxLayout, QLabel
-from PyQt5.QtGui import QPainter, QPen
-from PyQt5.QtCore import Qt, QRect, QLine
-from plugin_manager import PluginManager, Plugin
+from PyQt5.QtWidgets import (
+    QApplication, QWidget, QStackedWidget, QVBoxLayout, QLabel, QShortcut
+)
+from PyQt5.QtGui import QPainter, QPen, QKeySequence
+from PyQt5.QtCore import Qt, QRect, QLine, QThread, pyqtSignal
+import lv2_scan
+from plugin_manager import PluginManager, PluginCatalog, Plugin, SCAN_LV2
 from modhostmanager import (
-    connectToModHost, setUpPlugins, setUpPatch, verifyParameters,
-    updateBypass, startModHost, patchThrough, removeFirst, removeMiddle,
-    removeLast, removeFinal, add_plugin_end, swap_plugins_end,
-    swap_plugins_final, swap_plugins_middle, swap_plugins_start, unpatchThrough
+    updateBypass, patchThrough, applyDiff, applyParameters, outputDataReady,
+    failedParameters, missingInstances, driftFailures, ERRORS
 )
+from pedal_graph import PedalGraph
+from profile_cache import ProfileCache
+from profile_watcher import ProfileWatcher
+from journal import Journal, applyOp
+from warm_pool import WarmPool
+from supervisor import Supervisor
+from dsp_monitor import DspMonitor
+from modhost_worker import ModHostWorker
+from modhost_feedback import FeedbackListener
+from startup import PERIOD, NPERIODS
 from styles import (
     styles_window, color_foreground,
     ScrollBarStyle, color_background, ControlDisplayStyle,
-    BreadcrumbsBarStyle, styles_tabletitle, styles_tableitem
+    BreadcrumbsBarStyle, styles_tabletitle, styles_tableitem, styles_vallabel
 )
 from utils import config_dir
 from qwidgets.parameter_widgets import ParameterPanel
 from qwidgets.controls import ControlDisplay, RotaryEncoder
 from qwidgets.graphics_utils import SCREEN_H, SCREEN_W
 from qwidgets.navigation import (
-    BreadcrumbsBar, ScrollBar, ScrollItem, ScrollGroup
+    BreadcrumbsBar, ScrollBar, ScrollItem, ScrollGroup, VirtualScrollGroup
 )
 from qwidgets.floating_window import FloatingWindow, DialogItem
 from qwidgets.plugin_box import PluginBox, AddPluginBox
-from offboard import try_save
+from qwidgets.debug_window import DebugWindow
+from offboard import try_load, try_save
 
 modhost = None
 
+# Build a new profile next to the playing one and switch over in one burst.
+# Set MULTIFX_GAPLESS_SWITCH=0 to change the playing board in place instead,
+# which reuses instances but can drop audio for a moment.
+GAPLESS_SWITCH = os.environ.get("MULTIFX_GAPLESS_SWITCH", "1") not in ("", "0")
+# Set MULTIFX_VERIFY_PARAMETERS=1 to read every parameter back from mod-host
+# after loading a profile and report the ones that didn't stick.
+VERIFY_PARAMETERS = os.environ.get(
+    "MULTIFX_VERIFY_PARAMETERS", "0") not in ("", "0")
+
+
+class OffboardLoader(QThread):
+    """Copies configuration off a USB drive, if one is plugged in"""
+    loaded = pyqtSignal(bool)
+
+    def run(self):
+        self.loaded.emit(try_load())
+
+
+class CatalogScanner(QThread):
+    """Scans the installed LV2 plugins, which reads every bundle on first
+    boot"""
+    scanned = pyqtSignal(object)
+
+    def run(self):
+        self.scanned.emit(lv2_scan.scan())
+
 
 class MainWindow(QWidget):
     stack: QStackedWidget = None
@@ -66,40 +104,156 @@ class MainWindow(QWidget):
         self.stack.addWidget(self.start_screen)
 
         self.board_window = None  # Placeholder for later
-
-        self.reset_modhost()
-        patchThrough(modhost)  # Bypass all before we load plugins
+        # The profile the board was loaded from
+        self.profile = None
+        self.compiled = None
+        # Profile picked before the audio stack came up
+        self.pending_profile = None
+        self.audio_ready = False
+        self.audio_status = ""
+        # What jackd runs with once the queued mod-host jobs are done
+        self.jack_config = (PERIOD, NPERIODS)
+
+        # Hidden debug screen, keyboard only
+        self.debug_shortcut = QShortcut(QKeySequence(Qt.Key_F12), self)
+        self.debug_shortcut.setContext(Qt.ApplicationShortcut)
+        self.debug_shortcut.activated.connect(self.toggle_debug_screen)
+        # Board edits, keyboard only as well
+        self.undo_shortcut = QShortcut(QKeySequence.Undo, self)
+        self.undo_shortcut.setContext(Qt.ApplicationShortcut)
+        self.undo_shortcut.activated.connect(self.undo)
+        self.redo_shortcut = QShortcut(QKeySequence.Redo, self)
+        self.redo_shortcut.setContext(Qt.ApplicationShortcut)
+        self.redo_shortcut.activated.connect(self.redo)
+
+        # The board as it was edited before the last restart, loaded once
+        # audio is up
+        self.resumed = Journal.shared().resume()
+        if self.resumed is not None:
+            self.pending_profile = Journal.shared().profile
+
+        # All mod-host I/O happens on this thread
+        global modhost
+        modhost = ModHostWorker()
+        modhost.connected.connect(self.on_modhost_connected)
+        modhost.status.connect(self.on_audio_status)
+        QApplication.instance().aboutToQuit.connect(modhost.stop)
+        modhost.start()
+
+        # State changes mod-host reports on its own
+        self.feedback = FeedbackListener()
+        self.feedback.paramChanged.connect(self.on_feedback_param)
+        self.feedback.outputChanged.connect(self.on_feedback_output)
+        self.feedback.dataFinished.connect(
+            lambda: modhost.submit(outputDataReady))
+        QApplication.instance().aboutToQuit.connect(self.feedback.stop)
+        self.feedback.start()
+
+        # Warm instances of the most used plugins for quick adding
+        self.pool = WarmPool(
+            modhost, WarmPool.mostUsed(PluginCatalog.shared().templates()))
+
+        # jackd and mod-host come up on the mod-host thread while the USB
+        # drive is read on another, so the window shows up right away
+        modhost.startAudio()
+        modhost.submit(patchThrough)  # Bypass all before we load plugins
+        self.pool.refill()
+        # Restarts jackd or mod-host if they die and replays the board
+        self.supervisor = Supervisor(modhost, self.replay_board, self.pool)
+        # DSP load and xruns, shown on the board and the debug screen
+        self.dsp = DspMonitor(modhost)
+        self.offboard = OffboardLoader()
+        self.offboard.loaded.connect(self.on_offboard_loaded)
+        self.offboard.start()
+        # Installed plugins show up in the catalog once scanned
+        if SCAN_LV2:
+            self.scanner = CatalogScanner()
+            self.scanner.scanned.connect(PluginCatalog.shared().setInstalled)
+            QApplication.instance().aboutToQuit.connect(self.scanner.wait)
+            self.scanner.start()
+        # Profiles edited on disk are picked up while playing
+        self.watcher = ProfileWatcher()
+        self.watcher.changed.connect(self.on_profile_changed)
+        self.watcher.listChanged.connect(self.refresh_profiles)
 
         self.show()
 
     def launch_board(self, selected_profile):
         """Called when a JSON file is selected to load the board"""
+        if not self.audio_ready:
+            # Loaded by on_modhost_connected
+            self.pending_profile = selected_profile
+            self.start_screen.setStatus(
+                f"{self.audio_status}, {selected_profile} loads when ready")
+            return
         # Loading the profile takes a little, here for feedback
         BreadcrumbsBar.navForward("LOADING PLUGINS...")
         self.repaint()
 
-        board = PluginManager()
-        selected_json = selected_profile + ".json"
-        json_path = os.path.join(config_dir, selected_json)
-        board.initFromJSON(json_path)
-
-        # Restart mod-host so we can change profiles.
-        # This is inefficient and can be improved, but it's easy.
-        self.reset_modhost()
-        setUpPlugins(modhost, board)
-        setUpPatch(modhost, board)
-        verifyParameters(modhost, board)
+        # Parsed once, and again only if the file changes
+        profile = ProfileCache.shared().get(selected_profile)
+        journal = Journal.shared()
+        if self.resumed is not None and selected_profile == journal.profile:
+            # With the journal's edits, which go on from where they were
+            board, setup = self.resumed, None
+            journal.follow(board.plugins)
+        else:
+            board, setup = profile.board(), profile.setup
+            journal.begin(selected_profile, profile.digest, board.plugins)
+        self.resumed = None
+        self.profile = selected_profile
+        self.compiled = profile
+
+        # Switch to the new board, restarting mod-host only if the profile
+        # needs different JACK settings.
+        # Queued on the mod-host thread so the board shows up right away
+        current = PedalGraph()
+        if self.board_window is not None:
+            current = self.board_window.graph
+        jack_config = board.jack_config or (PERIOD, NPERIODS)
+        restart = jack_config != self.jack_config
+        if restart:
+            # Different buffer settings need a new jackd, and mod-host comes
+            # back empty with it
+            self.jack_config = jack_config
+            self.pool.clear()
+            modhost.startAudio(jack_config)
+            graph = PedalGraph().stage(board.plugins)
+            commands, retire = graph.build(), []
+        elif GAPLESS_SWITCH:
+            graph = current.stage(board.plugins)
+            commands, retire = current.switchover(graph, setup)
+        else:
+            # Plugins both boards share keep their instance
+            graph = current.rebuild(board.plugins)
+            commands, retire = current.diff(graph), []
+        modhost.submit(applyDiff, commands,
+                       callback=lambda failed: self.on_board_switched(
+                           board_window, failed))
+        if retire:
+            modhost.submit(applyDiff, retire)
+        if restart:
+            self.pool.refill()
+        if VERIFY_PARAMETERS:
+            modhost.submit(applyParameters, list(graph.nodes), True,
+                           callback=self.on_parameters_verified)
 
         # Remove old board window if it exists
         if self.board_window is not None:
             self.stack.removeWidget(self.board_window)
             self.board_window.deleteLater()
 
+        # Peak load and xruns are counted per profile
+        self.dsp.setProfile(selected_profile)
+
         # Create new board window and add it to the stack
-        self.board_window = BoardWindow(
+        board_window = self.board_window = BoardWindow(
             board,
             mod_host_manager=modhost,
             restart_callback=self.show_start_screen,
+            graph=graph,
+            pool=self.pool,
+            dsp=self.dsp,
         )
         self.stack.addWidget(self.board_window)
         self.stack.setCurrentWidget(self.board_window)  # Switch view
@@ -110,9 +264,8 @@ class MainWindow(QWidget):
         BreadcrumbsBar.navForward("view plugins")
 
     def show_start_screen(self):
-        """Switch back to the start screen."""
-        self.reset_modhost()
-        patchThrough(modhost)  # Bypass all before we load plugins
+        """Switch back to the start screen. The board keeps playing until
+        the next one is launched."""
         self.stack.setCurrentWidget(self.start_screen)  # Switch back
         self.stack.removeWidget(self.board_window)
         self.start_screen.setFocus()
@@ -121,23 +274,255 @@ class MainWindow(QWidget):
         ControlDisplay.setBind(RotaryEncoder.MIDDLE, "")
         ControlDisplay.setBind(RotaryEncoder.BOTTOM, "delete")
 
+    def on_feedback_param(self, instanceNum: int, symbol: str, value: float):
+        if self.board_window is not None:
+            self.board_window.feedbackParameter(instanceNum, symbol, value)
+
+    def on_feedback_output(self, instanceNum: int, symbol: str, value: float):
+        if self.board_window is not None:
+            self.board_window.feedbackOutput(instanceNum, symbol, value)
+
+    def toggle_debug_screen(self):
+        current = self.stack.currentWidget()
+        if type(current) is DebugWindow:
+            current.back()
+            return
+        encoders = [RotaryEncoder.TOP, RotaryEncoder.MIDDLE,
+                    RotaryEncoder.BOTTOM]
+        binds = [encoder.bindPress for encoder in encoders]
+
+        def back():
+            self.stack.setCurrentWidget(current)
+            self.stack.removeWidget(debug_window)
+            debug_window.deleteLater()
+            for encoder, bind in zip(encoders, binds):
+                ControlDisplay.setBind(encoder, bind)
+            current.setFocus()
+
+        debug_window = DebugWindow(back, self.dsp)
+        self.stack.addWidget(debug_window)
+        self.stack.setCurrentWidget(debug_window)
+
     def reset_modhost(self):
         """Starts or restarts modhost"""
-        startModHost()
+        self.pool.clear()
+        modhost.reset()
 
-        global modhost
-        modhost = connectToModHost()
-        if modhost is None:
-            print("Failed Closing...")
-            exit(1)
+    def on_audio_status(self, status: str):
+        self.audio_status = status
+        self.start_screen.setStatus(status)
+
+    def on_offboard_loaded(self, loaded: bool):
+        if not loaded:
+            return
+        print("Loaded data from USB drive!")
+        # Pick up the copied profiles
+        self.refresh_profiles()
+
+    def refresh_profiles(self):
+        """Lists the profiles in the config dir again"""
+        old = self.start_screen
+        self.start_screen = ProfileSelectWindow(self.launch_board)
+        self.start_screen.setStatus(self.audio_status)
+        self.stack.insertWidget(self.stack.indexOf(old), self.start_screen)
+        if self.stack.currentWidget() is old:
+            self.stack.setCurrentWidget(self.start_screen)
+            self.start_screen.setFocus()
+        self.stack.removeWidget(old)
+        old.deleteLater()
+
+    def on_modhost_connected(self, success: bool):
+        if success:
+            self.audio_ready = True
+            if self.pending_profile is not None:
+                profile, self.pending_profile = self.pending_profile, None
+                self.launch_board(profile)
+            return
+        if self.audio_ready:
+            return  # a restart by the supervisor, which retries it
+        print("Failed Closing...")
+        modhost.stop()
+        exit(1)
+
+    def on_parameters_verified(self, badParameters):
+        for plugin_name, parameter_name in badParameters or []:
+            print(f"Failed to set {parameter_name} on {plugin_name}")
+
+    def on_profile_changed(self, name: str):
+        """Applies an edit of the playing profile's file to the running
+        board. Only changed parameters, bypass and connections are sent, the
+        way a board switch without GAPLESS_SWITCH does it, so instances the
+        edit keeps play on."""
+        if name != self.profile or self.board_window is None:
+            return
+        profile = ProfileCache.shared().get(name)
+        if profile is self.compiled:
+            return  # touched, but the same content
+        self.compiled = profile
+        board = profile.board()
+        if not board.plugins:
+            print(f"Not reloading {name}, it has no plugins")
+            return
+        print(f"{name} changed on disk, reloading it")
+        if (board.jack_config or (PERIOD, NPERIODS)) != self.jack_config:
+            print(f"{name} changed its JACK settings, they apply when it is "
+                  "loaded again")
+        board_window = self.apply_board(board)
+        # Earlier edits were to the old file
+        Journal.shared().begin(name, profile.digest,
+                               board_window.plugins.plugins)
+
+    def undo(self):
+        self.apply_op(Journal.shared().undo())
+
+    def redo(self):
+        self.apply_op(Journal.shared().redo())
+
+    def apply_op(self, op: dict | None):
+        """Applies an undo or redo to the running board"""
+        if op is None or self.board_window is None:
+            return
+        manager = self.board_window.plugins
+        board = PluginManager([plugin.copy() for plugin in manager.plugins])
+        board.jack_config = manager.jack_config
+        applyOp(board.plugins, op)
+        board_window = self.apply_board(board)
+        Journal.shared().follow(board_window.plugins.plugins)
+
+    def apply_board(self, board: PluginManager) -> "BoardWindow":
+        """Turns the running board into board, returns the window showing
+        it. Only changed parameters, bypass and connections are sent."""
+        board_window = self.board_window
+        current = board_window.graph
+        graph = current.rebuild(board.plugins)
+        commands = current.diff(graph)
+        if chain(current.plugins()) == chain(board.plugins):
+            # Same plugins in the same order, the board keeps its widgets and
+            # takes the new values
+            for plugin, new in zip(current.plugins(), board.plugins):
+                plugin.restore(new.snapshot())
+            board_window.refreshValues()
+        else:
+            board_window = self.replace_board_window(board, graph)
+        modhost.submit(applyDiff, commands,
+                       callback=lambda failed: self.on_board_switched(
+                           board_window, failed))
+        if VERIFY_PARAMETERS:
+            modhost.submit(applyParameters, list(board_window.graph.nodes),
+                           True, callback=self.on_parameters_verified)
+        return board_window
+
+    def replace_board_window(self, board: PluginManager,
+                             graph: PedalGraph) -> "BoardWindow":
+        """Shows a reloaded board in place of the current one, on screen only
+        if the old one or one of its pages was"""
+        old = self.board_window
+        pages = [old, getattr(old, "param_window", None),
+                 getattr(old, "add_plugin_window", None)]
+        showing = self.stack.currentWidget() in pages
+        if showing and self.stack.currentWidget() is not old:
+            old.back_to_board()
+        board_window = self.board_window = BoardWindow(
+            board,
+            mod_host_manager=modhost,
+            restart_callback=self.show_start_screen,
+            graph=graph,
+            pool=self.pool,
+            dsp=self.dsp,
+        )
+        # Not in the stack while the start screen is up
+        if self.stack.indexOf(old) != -1:
+            self.stack.addWidget(board_window)
+        if showing:
+            self.stack.setCurrentWidget(board_window)
+            board_window.setFocus()
+        self.stack.removeWidget(old)
+        old.deleteLater()
+        return board_window
+
+    def on_board_switched(self, board_window, failed, replayed=False):
+        """Handles what mod-host rejected while switching boards. Plugins it
+        can't load are taken off the board, parameters and bypass that didn't
+        take are reported. mod-host is only restarted, and the board replayed
+        on it, when its graph no longer matches the board's, e.g. after a
+        remove or connect failed."""
+        if not failed:
+            return
+        missing = missingInstances(failed)
+        if missing and board_window is self.board_window:
+            board_window = self.drop_missing(missing)
+        nodes = [(instanceNum, plugin)
+                 for instanceNum, plugin in board_window.graph.nodes
+                 if instanceNum not in missing]
+        self.on_parameters_verified(failedParameters(nodes, failed))
+        drift = driftFailures(failed, missing)
+        if not drift or board_window is not self.board_window:
             return
+        for command, code in drift:
+            print(f"mod-host responded {code}: {ERRORS.get(code)} to {command}")
+        if replayed:
+            print("mod-host doesn't match the board even after a restart")
+            return
+        client = modhost.client
+        if client is not None and client.lost:
+            return  # the supervisor restarts it
+        print("Switching boards failed, restarting mod-host")
+        self.reset_modhost()
+        modhost.submit(applyDiff, self.replay_board(),
+                       callback=lambda failed: self.on_board_switched(
+                           board_window, failed, replayed=True))
+        self.pool.refill()
+
+    def drop_missing(self, missing: set[int]) -> "BoardWindow":
+        """Takes the plugins mod-host couldn't load, on the missing
+        instances, off the board and wires the chain around them. Returns
+        the window showing what is left. The removals are journaled, so
+        they can be undone once the plugins are installed."""
+        board_window = self.board_window
+        graph, commands = board_window.graph.bridge(missing)
+        journal = Journal.shared()
+        plugins = board_window.plugins.plugins
+        for position in reversed(range(len(board_window.graph))):
+            instanceNum, plugin = board_window.graph.nodes[position]
+            if instanceNum not in missing:
+                continue
+            print(f"Couldn't load {plugin.name}, is it installed? "
+                  "Leaving it off the board")
+            op = {"op": "remove", "index": position}
+            if journal.plugins is plugins:
+                journal.record(op)
+            applyOp(plugins, op)
+        board_window = self.replace_board_window(board_window.plugins, graph)
+        modhost.submit(applyDiff, commands,
+                       callback=lambda failed: self.on_board_switched(
+                           board_window, failed))
+        return board_window
+
+    def replay_board(self) -> list[str]:
+        """Commands putting the current board on a fresh mod-host"""
+        if self.board_window is None:
+            return PedalGraph().build()  # patched through
+        return self.board_window.graph.build()
+
+
+def chain(plugins: list[Plugin]) -> list[tuple]:
+    """What has to match for a board to take another's values in place"""
+    return [(plugin.uri, [parameter.symbol for parameter in plugin.parameters])
+            for plugin in plugins]
 
 
 class BoardWindow(QWidget):
     def __init__(
-            self, manager: PluginManager, mod_host_manager, restart_callback):
+            self, manager: PluginManager, mod_host_manager: ModHostWorker,
+            restart_callback, graph: PedalGraph = None,
+            pool: WarmPool = None, dsp: DspMonitor = None):
         super().__init__()
         self.plugins = manager
+        self.pool = pool
+        # What mod-host is running, in the order shown
+        self.graph = graph
+        if graph is None:
+            self.graph = PedalGraph(enumerate(manager.plugins))
         self.mod_host_manager = mod_host_manager
         self.restart_callback = restart_callback
         self.backgroundColor = color_background
@@ -152,7 +537,12 @@ class BoardWindow(QWidget):
         self.setPalette(palette)
         self.setAutoFillBackground(True)
 
-        self.pluginbox = BoxOfPlugins(self.plugins, self)
+        self.pluginbox = BoxOfPlugins(self.plugins, self,
+                                      self.graph.instances())
+
+        self.dsp = dsp
+        if dsp is not None:
+            dsp.sampled.connect(self.updateDsp)
 
         self.setFocusPolicy(Qt.StrongFocus)
 
@@ -204,6 +594,36 @@ class BoardWindow(QWidget):
                     try_save()
                     BreadcrumbsBar.navBackward()
 
+    def showEvent(self, event):
+        self.setFocus()
+        self.updateDsp()
+
+    def hideEvent(self, event):
+        BreadcrumbsBar.setInfo("")
+
+    def updateDsp(self):
+        """Shows the current and peak DSP load since the board was loaded,
+        and xruns if there were any"""
+        dsp = self.dsp
+        if dsp is None or not self.isVisible():
+            return
+        text = "DSP --"
+        if dsp.load is not None:
+            text = f"DSP {dsp.load:.0f}% pk {dsp.peak:.0f}%"
+        if dsp.xruns:
+            text += f" xr {dsp.xruns}"
+        BreadcrumbsBar.setInfo(text)
+
+    def refreshValues(self):
+        """Shows bypass and parameters after they changed underneath"""
+        for position, plugin in enumerate(self.plugins.plugins):
+            self.pluginbox.updateBypass(position, plugin.bypass)
+        param_window = getattr(self, "param_window", None)
+        if param_window is not None:
+            param_window.updateBypassVisual()
+            for position in range(len(param_window.plugin.parameters)):
+                param_window.updateParameter(position)
+
     def swap_plugins(self, dist: int) -> bool:
         index = self.curIndex()
         # don't swap with add plugin widget
@@ -214,78 +634,15 @@ class BoardWindow(QWidget):
             return
         items = self.pluginbox.boxes
 
+        Journal.shared().record(
+            {"op": "swap", "index": index, "other": index + dist})
         # swap in mod-host
-        # default, swap forward
-        instanceNumA = None
-        pluginA = None
-        instanceNumB = None
-        pluginB = None
-        beforePlugin = None
-        beforeInstanceNum = None
-        afterPlugin = None
-        afterInstanceNum = None
-        # when negative, swap backward
-        if dist < 0:
-            instanceNumB = items[index].instanceNum
-            pluginB = items[index].plugin
-            instanceNumA = items[index+dist].instanceNum
-            pluginA = items[index+dist].plugin
-            if index - 2 >= 0:
-                beforeInstanceNum = self.pluginbox.scroll_group.items[index-2].instanceNum
-                beforePlugin = self.pluginbox.scroll_group.items[index-2].plugin
-            if index + 1 < n-1:  # adjust n for AppPluginBox
-                afterInstanceNum = self.pluginbox.scroll_group.items[index+1].instanceNum
-                afterPlugin = self.pluginbox.scroll_group.items[index+1].plugin
-        else:  # swap forward
-            instanceNumA = items[index].instanceNum
-            pluginA = items[index].plugin
-            instanceNumB = items[index+dist].instanceNum
-            pluginB = items[index+dist].plugin
-            if index - 1 >= 0:
-                beforeInstanceNum = self.pluginbox.scroll_group.items[index-1].instanceNum
-                beforePlugin = self.pluginbox.scroll_group.items[index-1].plugin
-            if index + 2 < n-1:
-                afterInstanceNum = self.pluginbox.scroll_group.items[index+2].instanceNum
-                afterPlugin = self.pluginbox.scroll_group.items[index+2].plugin
-        # call mod-host manager based on what we determined
-        if beforeInstanceNum is None:
-            if afterInstanceNum is None:
-                swap_plugins_final(
-                        modhost,
-                        instanceNumA,
-                        pluginA,
-                        instanceNumB,
-                        pluginB)
-            else:
-                swap_plugins_start(
-                        modhost,
-                        instanceNumA,
-                        pluginA,
-                        instanceNumB,
-                        pluginB,
-                        afterInstanceNum,
-                        afterPlugin)
-        else:
-            if afterInstanceNum is None:
-                swap_plugins_end(
-                        modhost,
-                        instanceNumA,
-                        pluginA,
-                        instanceNumB,
-                        pluginB,
-                        beforeInstanceNum,
-                        beforePlugin)
-            else:
-                swap_plugins_middle(
-                        modhost,
-                        instanceNumA,
-                        pluginA,
-                        instanceNumB,
-                        pluginB,
-                        beforeInstanceNum,
-                        beforePlugin,
-                        afterInstanceNum,
-                        afterPlugin)
+        before = self.graph.copy()
+        self.graph.swap(index, index + dist)
+        self.mod_host_manager.submit(applyDiff, before.diff(self.graph))
+        plugins = self.plugins.plugins
+        plugins[index], plugins[index + dist] = (plugins[index + dist],
+                                                 plugins[index])
 
         # swap visually
         temp = items[index]
@@ -313,19 +670,11 @@ class BoardWindow(QWidget):
             return
         items = self.pluginbox.boxes
 
-        # remove in mod-host
-        if n == 2:  # use 2 because AddPluginBox will always stay
-            removeFinal(modhost, items[index].instanceNum)
-        elif index == n - 2:
-            removeLast(modhost, items[index].instanceNum, items[index].plugin,
-                       items[index-1].instanceNum, items[index-1].plugin)
-        elif index == 0:
-            removeFirst(modhost, items[index].instanceNum, items[index].plugin,
-                        items[index+1].instanceNum, items[index+1].plugin)
-        else:
-            removeMiddle(modhost, items[index].instanceNum, items[index].plugin,
-                         items[index-1].instanceNum, items[index-1].plugin,
-                         items[index+1].instanceNum, items[index+1].plugin)
+        Journal.shared().record({"op": "remove", "index": index})
+        # remove in mod-host, patches through when it was the last one
+        before = self.graph.copy()
+        self.graph.remove(index)
+        self.mod_host_manager.submit(applyDiff, before.diff(self.graph))
 
         # remove and adjust visuals
         # Prevent last item from sticking around
@@ -348,6 +697,7 @@ class BoardWindow(QWidget):
         self.pluginbox.scroll_group.update_bar()
 
     def add_plugin(self, plugin: Plugin):
+        Journal.shared().record({"op": "add", "uri": plugin.uri})
         self.curItem().unhover()
         # add plugin to board visual
         n = len(self.plugins.plugins)
@@ -361,20 +711,13 @@ class BoardWindow(QWidget):
         # hover new item
         newbox.hover()
         self.pluginbox.scroll_group.pos = n
-        # add to mod-host
-        maxInstanceNum = n
-        for item in self.pluginbox.scroll_group.items:
-            if type(item) is AddPluginBox:
-                continue
-            if item.instanceNum > maxInstanceNum:
-                maxInstanceNum = item.instanceNum
-        add_plugin_end(
-                modhost,
-                maxInstanceNum,
-                plugin,
-                n-1,
-                self.plugins.plugins[n-1]
-        )
+        # add to mod-host, after the last plugin in the chain
+        # using a warm instance if there is one
+        before = self.graph.copy()
+        warm = self.pool.take(plugin.uri) if self.pool is not None else None
+        newbox.instanceNum = self.graph.append(plugin, warm)
+        self.mod_host_manager.submit(
+                applyDiff, before.diff(self.graph, warm=(warm,)))
 
     def paintEvent(self, event):
         painter = QPainter(self)
@@ -385,27 +728,51 @@ class BoardWindow(QWidget):
         rect = QRect(0, 0, self.width()-1, self.height())
         painter.drawRect(rect)
 
-    def showEvent(self, event):
-        self.setFocus()
-
     def changeBypass(self, position):
         if position is None:
             return
         try:
             # get the value of bypass from the plugin our cursor is currently
             # on
-            plugin = self.plugins.plugins[position]
+            box = self.pluginbox.boxes[position]
+            plugin = box.plugin
             bypass = plugin.bypass
 
             # flip value
             bypass = bypass ^ 1
+            Journal.shared().record(
+                {"op": "bypass", "index": position, "value": bypass})
             plugin.bypass = bypass
-            updateBypass(self.mod_host_manager, position, plugin)
+            self.mod_host_manager.submit(updateBypass, box.instanceNum, plugin)
             self.pluginbox.updateBypass(position, bypass)
         except Exception as e:
             print(e)
             pass
 
+    def pluginBoxFor(self, instanceNum: int) -> PluginBox | None:
+        for box in self.pluginbox.boxes:
+            if type(box) is PluginBox and box.instanceNum == instanceNum:
+                return box
+        return None
+
+    def feedbackParameter(self, instanceNum: int, symbol: str, value: float):
+        """Applies a parameter change reported by mod-host"""
+        box = self.pluginBoxFor(instanceNum)
+        if box is None:
+            return
+        for position, parameter in enumerate(box.plugin.parameters):
+            if parameter.symbol == symbol:
+                parameter.setValue(value)
+                param_window = getattr(self, "param_window", None)
+                if param_window is not None and param_window.plugin is box.plugin:
+                    param_window.updateParameter(position)
+
+    def feedbackOutput(self, instanceNum: int, symbol: str, value: float):
+        """Stores a monitored output value reported by mod-host"""
+        box = self.pluginBoxFor(instanceNum)
+        if box is not None:
+            box.plugin.outputValues[symbol] = value
+
     def show_param_screen(self, plugin: PluginBox):
         """Switch to the param screen for a plugin.
         Uses PluginBox for easier indexing.
@@ -461,7 +828,8 @@ class BoardWindow(QWidget):
 class BoxOfPlugins(QWidget):
     pluginsPerPage: int = 3
 
-    def __init__(self, plugins: PluginManager, parent):
+    def __init__(self, plugins: PluginManager, parent,
+                 instances: list[int] = None):
         super().__init__()
         self.setGeometry(
             0, 0, SCREEN_W,
@@ -469,6 +837,7 @@ class BoxOfPlugins(QWidget):
         )
         self.plugins = plugins
         self.board_window = parent
+        self.instances = instances
         self.initGroup()
         self.setParent(parent)
 
@@ -479,9 +848,12 @@ class BoxOfPlugins(QWidget):
         for i in range(0, n):
             plugin = self.plugins.plugins[i]
             box = PluginBox(i, plugin, plugin.bypass)
+            if self.instances is not None:
+                box.instanceNum = self.instances[i]
             box.board_window = self.board_window
             self.boxes.append(box)
-        self.boxes[n-1].isLast = True
+        if n > 0:
+            self.boxes[n-1].isLast = True
         self.add_plugin_box = AddPluginBox()
         self.boxes.append(self.add_plugin_box)
         self.scroll_bar = ScrollBar(RotaryEncoder.TOP)
@@ -503,6 +875,8 @@ class BoxOfPlugins(QWidget):
 
 
 class ProfileSelectWindow(FloatingWindow):
+    STATUS_PADDING = 8
+
     def __init__(self, callback):
         self.json_dir = os.path.dirname(config_dir)
         self.json_files = self.get_json_files(config_dir)
@@ -510,16 +884,23 @@ class ProfileSelectWindow(FloatingWindow):
 
         self.callback = callback
 
-        # Floating window
-        dialog_items = []
-        for p in self.json_files:
-            item = DialogItem(p.replace(".json", ""))
-            dialog_items.append(item)
-        scroll_group = ScrollGroup(4, RotaryEncoder.TOP, dialog_items)
+        # Floating window, one DialogItem per visible row
+        names = [p.replace(".json", "") for p in self.json_files]
+        scroll_group = VirtualScrollGroup(4, RotaryEncoder.TOP, names,
+                                          lambda: DialogItem(""))
         super().__init__("SELECT PROFILE", scroll_group, RotaryEncoder.TOP,
                          callback)
         ControlDisplay.setBind(RotaryEncoder.BOTTOM, "delete")
 
+        # Audio stack startup progress
+        self.status_label = QLabel("", self)
+        self.status_label.setStyleSheet(styles_vallabel)
+        self.status_label.move(self.STATUS_PADDING, self.STATUS_PADDING)
+
+    def setStatus(self, status: str):
+        self.status_label.setText(status)
+        self.status_label.adjustSize()
+
     def keyPressEvent(self, event):
         super().keyPressEvent(event)
         key = event.key()
@@ -530,24 +911,10 @@ class ProfileSelectWindow(FloatingWindow):
 
     def remove_profile(self):
         # TODO: Prompt to confirm
-        index = self.group.pos
-        items = self.group.items
-        n = len(items)
-        if index >= n:
-            return
-        # Prevent last item from sticking around
-        items[index].hide()
-        items.pop(index)
-        # cleared group
-        if n == 1:
+        if self.group.pos >= len(self.group.items):
             return
-        # adjust to new position
-        if index < n - 1:
-            items[index].hover()
-        if self.group.window_top != 0 or index == n - 1:
-            self.group.goPrevEdge()
+        self.group.removeRow(self.group.pos)
         self.group.repaint()
-        self.group.drawItems()
         super().update_continues()
         # TODO: actually delete profile
 
@@ -592,22 +959,21 @@ class PluginTable(QWidget):
 
         self.scroll_bar = ScrollBar(RotaryEncoder.TOP)
         self.scroll_bar.setParent(self)
-        items = []
         # count number of plugins and place them in
-        plugincounts = {}
-        all_plugins = PluginManager.all_plugins()
         # NOTE: Things will get screwy if there are multiple plugins by the
         # same name. Must be unique
-        for plugin in all_plugins:
-            plugincounts[plugin.name] = 0
+        catalog = PluginCatalog.shared()
+        plugincounts = {plugin.name: 0 for plugin in catalog.templates()}
         for plugin in self.plugins.plugins:
-            plugincounts[plugin.name] += 1
-        for key, value in sorted(plugincounts.items(), key=lambda x: x):
-            actual_plugin = next((plugin for plugin in all_plugins if key == plugin.name), None)
-            if actual_plugin is not None:
-                items.append(PluginTableEntry(actual_plugin, value, self))
-        self.scroll_group = ScrollGroup(
-            self.PAGE_SIZE, RotaryEncoder.TOP, items, self.scroll_bar
+            if plugin.name in plugincounts:
+                plugincounts[plugin.name] += 1
+        # Rows show catalog templates, the board gets a copy. Only a page of
+        # entries is made however big the catalog is
+        rows = [(catalog.template(name), count)
+                for name, count in sorted(plugincounts.items())]
+        self.scroll_group = VirtualScrollGroup(
+            self.PAGE_SIZE, RotaryEncoder.TOP, rows,
+            lambda: PluginTableEntry(self), self.scroll_bar
         )
         self.scroll_group.setParent(self)
         self.scroll_group.update_bar()
@@ -638,34 +1004,45 @@ class PluginTable(QWidget):
             case RotaryEncoder.TOP.keyLeft:
                 self.scroll_group.goPrev()
             case RotaryEncoder.TOP.keyPress:
-                self.add_callback(self.scroll_group.curItem().plugin)
+                cur = self.scroll_group.curItem()
+                if cur is None:
+                    return
+                self.add_callback(cur.plugin.copy())
                 self.back_callback()
             case RotaryEncoder.TOP.keyRight:
                 self.scroll_group.goNext()
 
 
 class PluginTableEntry(ScrollItem):
-    def __init__(self, plugin: Plugin, count: int, table: PluginTable):
-        super().__init__(plugin.name)
+    """A PluginTable row, bound to (plugin, count)"""
+
+    def __init__(self, table: PluginTable):
+        super().__init__("")
         self.hover_fill = RotaryEncoder.TOP.color
         self.unhover_fill = color_background
         self.line_width = 0  # prevent drawing rectagle edges
         self.table = table
-        self.plugin = plugin
+        self.plugin = None
         self.setFixedSize(
             table.end_x,
             int((1 - BreadcrumbsBarStyle.REL_H) * SCREEN_H - table.start_y) //
             PluginTable.PAGE_SIZE
         )
-        self.name_label = QLabel(plugin.name, self)
+        self.name_label = QLabel(self)
         self.name_label.setStyleSheet(styles_tableitem)
+        self.count_label = QLabel(self)
+        self.count_label.setStyleSheet(styles_tableitem)
+
+    def bind(self, row: tuple[Plugin, int]):
+        plugin, count = row
+        super().bind(plugin.name)
+        self.plugin = plugin
+        self.name_label.setText(plugin.name)
         self.name_label.adjustSize()
         # pad and center
         self.name_label.move(PluginTable.PADDING,
                              self.height()//2 - self.name_label.height()//2)
-
-        self.count_label = QLabel(str(count), self)
-        self.count_label.setStyleSheet(styles_tableitem)
+        self.count_label.setText(str(count))
         self.count_label.adjustSize()
         # pad and center
         self.count_label.move(self.table.col2title.x(),
@@ -0,0 +1,104 @@
+"""Hidden debug screen showing mod-host link instrumentation"""
+from PyQt5.QtWidgets import QWidget, QLabel
+from PyQt5.QtCore import Qt, QTimer
+from styles import styles_debug, BreadcrumbsBarStyle
+from qwidgets.graphics_utils import SCREEN_W, SCREEN_H
+from qwidgets.controls import ControlDisplay, RotaryEncoder
+from qwidgets.navigation import BreadcrumbsBar
+from instrumentation import stats
+from modhostmanager import ERRORS
+
+
+class DebugWindow(QWidget):
+    """Opened with F12 from any screen. Not reachable from the pedal."""
+    PADDING = 8
+    REFRESH_MS = 500
+
+    def __init__(self, back_callback, dsp=None):
+        super().__init__()
+        self.dsp = dsp
+        self.setFixedSize(
+            SCREEN_W,
+            int((1 - BreadcrumbsBarStyle.REL_H) * SCREEN_H)
+        )
+        self.back_callback = back_callback
+        self.label = QLabel(self)
+        self.label.setStyleSheet(styles_debug)
+        self.label.setAlignment(Qt.AlignLeft | Qt.AlignTop)
+        self.label.move(self.PADDING, self.PADDING)
+        self.label.setFixedSize(self.width() - 2 * self.PADDING,
+                                self.height() - 2 * self.PADDING)
+        self.message = ""
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(self.REFRESH_MS)
+        self.setFocusPolicy(Qt.StrongFocus)
+        self.refresh()
+
+    def refresh(self):
+        data = stats.toJSON()
+        lines = [
+            "MOD-HOST LINK",
+            f"uptime {data['uptime_s']:.0f}s  round trips {data['round_trips']}"
+            f"  commands {data['commands_sent']}",
+            "restarts " + (", ".join(
+                f"{component} {count}"
+                for component, count in sorted(data["restarts"].items()))
+                or "none")
+            + (f"  last recovery {data['last_recovery_ms']:.0f}ms"
+               if data["last_recovery_ms"] is not None else ""),
+        ]
+        if data["gave_up"]:
+            lines.append("gave up restarting " + ", ".join(data["gave_up"]))
+        if self.dsp is not None and self.dsp.load is not None:
+            lines.append(
+                f"DSP {self.dsp.load:.1f}%  peak {self.dsp.peak:.1f}%"
+                f"  xruns {self.dsp.xruns}  ({self.dsp.profile})")
+        lines += [
+            "",
+            f"{'command':<11}{'n':>6}{'avg':>7}{'p90':>6}{'max':>8}"
+            f"{'t/o':>5}{'err':>5}",
+        ]
+        for name, command in sorted(data["commands"].items()):
+            lines.append(
+                f"{name[:10]:<11}{command['count']:>6}"
+                f"{command['mean_ms']:>7.1f}{command['p90_ms']:>6.0f}"
+                f"{command['max_ms']:>8.1f}{command['timeouts']:>5}"
+                f"{sum(command['errors'].values()):>5}"
+            )
+        errors = stats.errors()
+        if errors:
+            lines += ["", "errors"]
+            for code, hits in sorted(errors.items()):
+                lines.append(f"  {code:>5} {ERRORS.get(code, '?'):<30}{hits:>6}")
+        if self.message:
+            lines += ["", self.message]
+        self.label.setText("\n".join(lines))
+
+    def showEvent(self, event):
+        BreadcrumbsBar.navForward("debug")
+        ControlDisplay.setBind(RotaryEncoder.TOP, "dump")
+        ControlDisplay.setBind(RotaryEncoder.MIDDLE, "reset")
+        ControlDisplay.setBind(RotaryEncoder.BOTTOM, "back")
+        self.setFocus()
+
+    def keyPressEvent(self, event):
+        key = event.key()
+
+        match key:
+            case RotaryEncoder.TOP.keyPress:
+                self.message = f"dumped to {stats.dump()}"
+                if self.dsp is not None:
+                    self.message += f"\nand {self.dsp.dump()}"
+                self.refresh()
+            case RotaryEncoder.MIDDLE.keyPress:
+                stats.reset()
+                self.message = ""
+                self.refresh()
+            case RotaryEncoder.BOTTOM.keyPress:
+                self.back()
+
+    def back(self):
+        self.timer.stop()
+        BreadcrumbsBar.navBackward()
+        self.back_callback()
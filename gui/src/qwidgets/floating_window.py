@@ -88,21 +88,18 @@ class FloatingWindow(QWidget):
                 self.group.goNext()
                 self.update_continues()
             case self.encoder.keyPress | Qt.Key_R:
-                self.callback(self.group.curItem().id)
+                cur = self.group.curItem()
+                if cur is not None:
+                    self.callback(cur.id)
 
 
 class DialogItem(ScrollItem):
     def __init__(self, id: str):
         super().__init__(id)
         self.setFixedSize(180, 48)
-        self.title_label = QLabel(self.id, self)
-        self.title_label.setAlignment(Qt.AlignCenter)
+        self.title_label = QLabel(self, alignment=Qt.AlignCenter)
         self.title_label.setStyleSheet(FloatingWindowStyle.css_options)
-        self.title_label.adjustSize()
-        self.title_label.move(
-            self.width() // 2 - self.title_label.width() // 2,
-            self.height() // 2 - self.title_label.height() // 2
-        )
+        self.bind(id)
         self.hover_fill = RotaryEncoder.TOP.color
         self.unhover_fill = color_background
         self.line_width = 0
@@ -115,3 +112,12 @@ class DialogItem(ScrollItem):
 
     def select(self):
         print(f"selected {id}")
+
+    def bind(self, id: str):
+        super().bind(id)
+        self.title_label.setText(id)
+        self.title_label.adjustSize()
+        self.title_label.move(
+            self.width() // 2 - self.title_label.width() // 2,
+            self.height() // 2 - self.title_label.height() // 2
+        )
@@ -68,12 +68,26 @@ class BreadcrumbsBar(QWidget):
             BreadcrumbsBarStyle.PADDING,
             self.height() // 2 - self.label.height() // 2
         )
+        # Status shown on the right, e.g. DSP load on the board screen
+        self.info = QLabel("", self)
+        self.info.setAlignment(Qt.AlignRight | Qt.AlignVCenter)
+        self.info.setStyleSheet(styles_crumbs)
+        self.info.setGeometry(
+            self.width() // 2,
+            BreadcrumbsBarStyle.LINE_WIDTH,
+            self.width() // 2 - BreadcrumbsBarStyle.PADDING,
+            self.height() - 2 * BreadcrumbsBarStyle.LINE_WIDTH
+        )
+        self.info.lower()  # Long crumbs go over it
 
     def navForward(newScreen: str):
         BreadcrumbsBar.crumbs.append(newScreen)
         BreadcrumbsBar.instance.label.setText(BreadcrumbsBar.labelText())
         BreadcrumbsBar.instance.label.adjustSize()
 
+    def setInfo(text: str):
+        BreadcrumbsBar.instance.info.setText(text)
+
     def navBackward():
         crumbs = BreadcrumbsBar.crumbs
         crumbs.pop(len(crumbs) - 1)
@@ -102,6 +116,10 @@ class ScrollItem(QWidget):
     def select(self):
         print(f"selected {id}")
 
+    def bind(self, row):
+        """Shows row, for items reused by a VirtualScrollGroup"""
+        self.id = row
+
     def paintEvent(self, event):
         painter = QPainter(self)
         pen = QPen(QColor.fromRgb(255, 255, 255), self.line_width)
@@ -263,6 +281,103 @@ class ScrollGroup(QWidget):
         self.scroll_bar.drawFor(self)
 
 
+class VirtualScrollGroup(ScrollGroup):
+    """A ScrollGroup over data rows that only has widgets for one page.
+
+    items holds the rows. make_item() creates page_size widgets up front and
+    each is handed its row with bind(row) as the window moves, so opening
+    and scrolling take the same time for 5 rows or 500. curItem() is the
+    widget showing the current row.
+    """
+    widgets: List[ScrollItem] = []
+
+    def __init__(self, page_size: int, encoder: RotaryEncoderData,
+                 rows: list, make_item, scroll_bar=None,
+                 page_mode: PageMode = PageMode.SCROLL):
+        super().__init__(page_size, encoder, [], scroll_bar, page_mode)
+        self.items = rows
+        self.widgets = [make_item() for _ in range(page_size)]
+        for widget in self.widgets:
+            widget.setParent(self)
+            widget.hide()
+        self.setFixedSize(self.widgets[0].width(),
+                          page_size * self.widgets[0].height())
+        self.drawItems()
+
+    def hide_all(self):
+        for widget in self.widgets:
+            widget.hide()
+
+    def curItem(self):
+        if not self.items:
+            return None
+        return self.widgets[self.pos - self.window_top]
+
+    def moveTo(self, pos: int) -> ScrollItem:
+        """Makes pos the current row, moving the window if it's outside"""
+        old = self.pos
+        self.pos = pos
+        top = self.window_top
+        if pos > self.window_bottom:
+            match self.page_mode:
+                case PageMode.SCROLL:
+                    top = pos - self.page_size + 1
+                case PageMode.JUMP:
+                    top += self.page_size
+        elif pos < self.window_top:
+            match self.page_mode:
+                case PageMode.SCROLL:
+                    top = pos
+                case PageMode.JUMP:
+                    top -= self.page_size
+        if top != self.window_top:
+            self.window_top = top
+            self.window_bottom = top + self.page_size - 1
+            self.drawItems()
+        else:
+            self.widgets[old - top].unhover()
+            self.curItem().hover()
+        self.update_bar()
+        return self.curItem()
+
+    def goNext(self) -> ScrollItem:
+        if self.pos >= len(self.items) - 1:
+            return
+        return self.moveTo(self.pos + 1)
+
+    def goPrev(self) -> ScrollItem:
+        if self.pos <= 0:
+            return
+        return self.moveTo(self.pos - 1)
+
+    def removeRow(self, index: int):
+        """Drops a row, keeping the window full where there are rows to
+        fill it"""
+        self.items.pop(index)
+        n = len(self.items)
+        self.pos = max(0, min(self.pos, n - 1))
+        self.window_top = max(0, min(self.window_top, n - self.page_size))
+        self.window_top = min(self.window_top, self.pos)
+        self.window_bottom = self.window_top + self.page_size - 1
+        self.drawItems()
+        self.update_bar()
+
+    def drawItems(self):
+        """Binds the rows in the window to the page's widgets"""
+        height = self.widgets[0].height() if self.widgets else 0
+        for slot, widget in enumerate(self.widgets):
+            row = self.window_top + slot
+            if row >= len(self.items):
+                widget.hovered = False
+                widget.hide()
+                continue
+            widget.bind(self.items[row])
+            widget.hovered = row == self.pos
+            widget.move(0, slot * height)
+            widget.show()
+            widget.update()
+
+
 class ScrollBar(QWidget):
     def __init__(self, encoder: RotaryEncoderData):
         super().__init__()
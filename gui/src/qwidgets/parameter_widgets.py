@@ -8,7 +8,8 @@ from PyQt5.QtCore import Qt, QRect
 from plugin_manager import Plugin, Parameter
 from styles import (styles_label, BreadcrumbsBarStyle, ScrollBarStyle,
                     styles_paramlabel, styles_vallabel, color_background)
-from modhostmanager import updateParameter
+from modhost_worker import ModHostWorker
+from journal import Journal
 from qwidgets.graphics_utils import SCREEN_W, SCREEN_H
 from qwidgets.controls import RotaryEncoder
 from qwidgets.plugin_box import PluginBox
@@ -21,7 +22,7 @@ class ParameterPanel(QWidget):
 
     def __init__(
             self, pluginbox: PluginBox = None,
-            mod_host_manager=None, back_callback=None):
+            mod_host_manager: ModHostWorker = None, back_callback=None):
         super().__init__()
         self.setFixedSize(SCREEN_W, SCREEN_H)
         self.pluginbox = pluginbox
@@ -82,21 +83,20 @@ class ParameterPanel(QWidget):
             print(e)
             pass
 
+    def record(self, position: int, value: float):
+        Journal.shared().record({"op": "param", "index": self.pluginbox.index,
+                                 "param": position, "value": value})
+
     def decreaseParameter(self, position: int):
         params = self.plugin.parameters
         try:
             parameter: Parameter = params[position]
-            parameter.setValue(round(max(
+            value = round(max(
                 parameter.minimum, parameter.value - parameter.increment), 2)
-            )
-            res = updateParameter(
-                    self.mod_host_manager,
-                    self.pluginbox.index,
-                    parameter
-            )
-            if res != 0:
-                print("Failed to update")
-                pass
+            self.record(position, value)
+            parameter.setValue(value)
+            # Coalesced on the mod-host thread, the UI updates right away
+            self.mod_host_manager.setParameter(self.pluginbox.instanceNum, parameter)
             self.updateParameter(position)
             self.update()
         except Exception as e:
@@ -107,16 +107,12 @@ class ParameterPanel(QWidget):
         params = self.plugin.parameters
         try:
             parameter: Parameter = params[position]
-            parameter.setValue(round(min(
+            value = round(min(
                 parameter.max, parameter.value + parameter.increment), 2)
-            )
-            if updateParameter(
-                    self.mod_host_manager,
-                    self.pluginbox.index,
-                    parameter
-            ) != 0:
-                print("Failed to update")
-                pass
+            self.record(position, value)
+            parameter.setValue(value)
+            # Coalesced on the mod-host thread, the UI updates right away
+            self.mod_host_manager.setParameter(self.pluginbox.instanceNum, parameter)
             self.updateParameter(position)
             self.update()
         except Exception as e:
@@ -0,0 +1,212 @@
+"""Brings up the audio stack by probing for readiness instead of sleeping.
+
+Every step is polled with a short exponential backoff under a deadline and
+gives up as soon as a failure shows, such as the process exiting or printing
+a known error. jackd falls back to the dummy backend right away rather than
+after a fixed wait.
+"""
+
+import collections
+import os
+import subprocess
+import threading
+import time
+
+# Longest each jackd backend gets to come up, and mod-host to accept us
+DEADLINE_S = 5.0
+BACKOFF_FIRST_S = 0.01
+BACKOFF_MAX_S = 0.2
+# jackd has to stay up this long after answering. One that finds another
+# server answers through it, then exits.
+CONFIRM_S = 0.1
+
+JACKD = "/usr/bin/jackd"
+ALSA_DEVICE = "hw:sndrpihifiberry"
+SAMPLE_RATE = 96000
+# Frames per period and periods per buffer, unless the profile says otherwise
+# (see jack_tuning.py). Only the ALSA backend takes a period count.
+PERIOD = 128
+NPERIODS = 2
+
+# jackd output meaning the backend won't come up
+JACK_FAILURES = (
+    "Failed to open", "Cannot initialize driver", "Cannot open PCM device",
+    "cannot load driver module",
+    # Another jackd holds the server name, this one exits
+    "already running",
+)
+# Without jack_lsp installed, readiness is read from jackd's output instead.
+# The ALSA backend prints this once the device is open.
+ALSA_READY = ("configuring for",)
+# jackd reports each xrun on a line containing this, in any case
+XRUN = "xrun"
+
+# Output of the processes started here, by name
+logs: dict[str, "ProcessLog"] = {}
+# Backend of the last jackd startAudio() brought up, "alsa" or "dummy"
+backend: str | None = None
+
+
+class ProcessLog:
+    """Drains a process's output on a thread, so it can't stall on a full
+    pipe, and keeps the last lines for failure checks"""
+
+    def __init__(self, name: str, process: subprocess.Popen, size: int = 200):
+        self.name = name
+        self.process = process
+        self.lines = collections.deque(maxlen=size)
+        self.xruns = 0  # lines reporting an xrun, from jackd
+        self.lock = threading.Lock()
+        threading.Thread(target=self.run, daemon=True).start()
+        logs[name] = self
+
+    def run(self):
+        for raw in self.process.stdout:
+            line = raw.decode(errors="replace").rstrip()
+            with self.lock:
+                self.lines.append(line)
+                if XRUN in line.lower():
+                    self.xruns += 1
+
+    def tail(self) -> list[str]:
+        with self.lock:
+            return list(self.lines)
+
+    def contains(self, patterns) -> str | None:
+        """First line containing any of the patterns"""
+        for line in self.tail():
+            if any(pattern in line for pattern in patterns):
+                return line
+        return None
+
+    def exited(self) -> bool:
+        return self.process.poll() is not None
+
+
+def waitFor(probe, deadline: float, failed=lambda: False) -> bool:
+    """Polls probe() with exponential backoff until it returns True. Gives up
+    when failed() returns True or time.monotonic() passes deadline."""
+    delay = BACKOFF_FIRST_S
+    while True:
+        if probe():
+            return True
+        if failed():
+            return False
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, BACKOFF_MAX_S)
+
+
+def launch(name: str, command: list[str]) -> subprocess.Popen | None:
+    try:
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            # Makes it independent of the parent process
+            preexec_fn=os.setpgrp,
+        )
+    except OSError as e:
+        print(f"Failed to start {name}: {e}")
+        return None
+    ProcessLog(name, process)
+    return process
+
+
+def stop(process: subprocess.Popen | None, timeout: float = 2.0):
+    """Terminates a process we started and waits for it to go away"""
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def jackServerUp(log: ProcessLog, ready=()) -> bool:
+    """Asks the JACK server for its ports, without starting one. Without
+    jack_lsp, jackd is taken to be up once it prints one of the ready lines
+    (if any) and hasn't exited."""
+    # jack_lsp answers for any server, only ours counts
+    if log.exited():
+        return False
+    env = dict(os.environ, JACK_NO_START_SERVER="1")
+    try:
+        return subprocess.run(
+            ["jack_lsp"], env=env, stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL, timeout=1).returncode == 0
+    except FileNotFoundError:
+        return not log.exited() and (not ready or log.contains(ready) is not None)
+    except subprocess.TimeoutExpired:
+        return False
+
+
+def jackdRunning() -> bool:
+    """Whether any jackd process is running, ours or not"""
+    try:
+        return subprocess.run(
+            ["killall", "-0", "jackd"], stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL).returncode == 0
+    except FileNotFoundError:
+        return False
+
+
+def stopStaleJack(deadline_s: float = DEADLINE_S):
+    """Stops a jackd we didn't start, e.g. one left running by an earlier
+    GUI, which would keep ours from taking the server"""
+    if not jackdRunning():
+        return
+    print("Stopping a jackd that was already running")
+    subprocess.run(["killall", "jackd"], stdout=subprocess.DEVNULL,
+                   stderr=subprocess.DEVNULL, check=False)
+    if not waitFor(lambda: not jackdRunning(),
+                   time.monotonic() + deadline_s):
+        subprocess.run(["killall", "-9", "jackd"], stdout=subprocess.DEVNULL,
+                       stderr=subprocess.DEVNULL, check=False)
+
+
+def startJack(backend: list[str], ready=(), deadline_s: float = DEADLINE_S):
+    """Starts jackd with a backend and waits until it is up. Returns the
+    process, or None after stopping it if it failed"""
+    stopStaleJack()
+    process = launch("jackd", [JACKD, *backend])
+    if process is None:
+        return None
+    log = logs["jackd"]
+
+    def failed():
+        return log.exited() or log.contains(JACK_FAILURES) is not None
+
+    if (waitFor(lambda: jackServerUp(log, ready),
+                time.monotonic() + deadline_s, failed)
+            and not waitFor(failed, time.monotonic() + CONFIRM_S)):
+        return process
+    reason = log.contains(JACK_FAILURES) or "not ready in time"
+    print(f"jackd {' '.join(backend)} failed: {reason}")
+    stop(process)
+    return None
+
+
+def startAudio(period: int = PERIOD,
+               nperiods: int = NPERIODS) -> subprocess.Popen | None:
+    """Starts jackd on the sound card, or the dummy backend if that fails"""
+    global backend
+    rate = ["-r", str(SAMPLE_RATE), "-p", str(period)]
+    process = startJack(
+        ["-d", "alsa", "-d", ALSA_DEVICE, *rate, "-n", str(nperiods)],
+        ALSA_READY)
+    if process is not None:
+        print(f"JACK server started successfully, {period}x{nperiods}.")
+        backend = "alsa"
+        return process
+    print("JACK server failed to start. Falling back to dummy.")
+    process = startJack(["-d", "dummy", *rate])
+    backend = "dummy"
+    if process is None:
+        print("Dummy JACK server failed to start too.")
+        backend = None
+    return process
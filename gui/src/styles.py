@@ -104,6 +104,14 @@ styles_error = f"""
     color: {color_error.name()};
 """
 
+# Hidden debug screen, monospace so the tables line up
+styles_debug = f"""
+    font: 13px;
+    font-family: monospace;
+    color: {color_foreground.name()};
+    background: transparent;
+"""
+
 styles_crumbs = f"""
     font: 14px;
     font-family: {font_family};
@@ -0,0 +1,132 @@
+"""Brings the audio engine back when jackd or mod-host dies mid-set"""
+
+import time
+from PyQt5.QtCore import QObject, QTimer
+import modhostmanager
+from modhostmanager import applyDiff, MOCK_MODHOST
+from instrumentation import stats
+
+
+def exited(process) -> bool:
+    return process is not None and process.poll() is not None
+
+
+def running(process) -> bool:
+    return process is not None and process.poll() is None
+
+
+def replayBoard(client, commands: list[str]):
+    """applyDiff, unless mod-host didn't come up to take it"""
+    if client is None:
+        return None
+    return applyDiff(client, commands)
+
+
+class Supervisor(QObject):
+    """Watches jackd and mod-host and recovers from either dying.
+
+    A component is dead when its process exits or the mod-host socket breaks
+    (ModHostWorker.lost). It is restarted on the mod-host thread, then the
+    board is replayed in one batch from the commands replay() returns, which
+    are built from the in-memory model when the crash is noticed.
+
+    A recovery only counts once jackd and mod-host are running and connected
+    again. Restarts that fail, or crash again within STABLE_S, are retried
+    with exponential backoff, and after MAX_RESTARTS in a row the supervisor
+    gives up.
+    """
+    CHECK_MS = 100
+    BACKOFF_FIRST_MS = 250
+    BACKOFF_MAX_MS = 8000
+    MAX_RESTARTS = 5
+    # Up this long after a recovery and the next crash starts a fresh count
+    STABLE_S = 10.0
+
+    def __init__(self, worker, replay, pool=None):
+        super().__init__()
+        self.worker = worker
+        self.replay = replay
+        self.pool = pool
+        self.component = None  # being recovered
+        self.started = 0.0
+        self.attempts = 0  # restarts in a row without staying up
+        self.recoveredAt = None
+        self.gaveUp = False
+        worker.lost.connect(lambda: self.recover("mod-host"))
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.check)
+        self.timer.start(self.CHECK_MS)
+
+    def check(self):
+        if self.component is not None:
+            return
+        if exited(modhostmanager.jackd_process):
+            self.recover("jackd")
+        elif exited(modhostmanager.modhost_process):
+            self.recover("mod-host")
+        elif (self.attempts and self.recoveredAt is not None
+              and time.monotonic() - self.recoveredAt > self.STABLE_S):
+            self.attempts = 0
+
+    def healthy(self) -> bool:
+        """Whether the audio stack is up and mod-host connected"""
+        if not MOCK_MODHOST and not (
+                running(modhostmanager.jackd_process)
+                and running(modhostmanager.modhost_process)):
+            return False
+        client = self.worker.client
+        return client is not None and not client.lost
+
+    def recover(self, component: str):
+        if self.component is not None or self.gaveUp:
+            return
+        self.component = component
+        if self.attempts >= self.MAX_RESTARTS:
+            self.giveUp()
+            return
+        delay = 0
+        if self.attempts:
+            delay = min(self.BACKOFF_FIRST_MS * 2 ** (self.attempts - 1),
+                        self.BACKOFF_MAX_MS)
+        self.attempts += 1
+        if delay:
+            print(f"Restarting {component} again in {delay} ms")
+        else:
+            print(f"{component} died, restarting it")
+        QTimer.singleShot(delay, self.restart)
+
+    def restart(self):
+        self.started = time.perf_counter()
+        if self.pool is not None:
+            self.pool.clear()
+        if self.component == "jackd":
+            # mod-host goes down with it
+            self.worker.startAudio()
+        else:
+            self.worker.reset()
+        self.worker.submit(replayBoard, self.replay(), callback=self.recovered)
+
+    def recovered(self, failed):
+        component, self.component = self.component, None
+        if not self.healthy():
+            print(f"{component} didn't come back")
+            jackdDown = (not MOCK_MODHOST
+                         and not running(modhostmanager.jackd_process))
+            self.recover("jackd" if jackdDown else "mod-host")
+            return
+        recovery_ms = (time.perf_counter() - self.started) * 1000
+        stats.record_restart(component, recovery_ms)
+        print(f"{component} recovered in {recovery_ms:.0f} ms")
+        for command, code in failed or []:
+            print(f"mod-host responded {code} to {command} while replaying")
+        self.recoveredAt = time.monotonic()
+        if self.pool is not None:
+            self.pool.refill()
+
+    def giveUp(self):
+        """Stops restarting after MAX_RESTARTS failed in a row"""
+        self.gaveUp = True
+        self.timer.stop()
+        stats.record_give_up(self.component)
+        print(f"{self.component} keeps dying, gave up after "
+              f"{self.attempts} restarts")
@@ -7,3 +7,6 @@ src_dir = os.path.dirname(os.path.abspath(sys.argv[0]))
 root_dir = os.path.normpath(os.path.join(src_dir, ".."))
 config_dir = os.path.join(root_dir, "config")
 assets_dir = os.path.join(root_dir, "assets")
+logs_dir = os.path.join(root_dir, "logs")
+cache_dir = os.path.join(root_dir, "cache")
+state_dir = os.path.join(root_dir, "state")
@@ -0,0 +1,104 @@
+"""Pre-instantiated plugins so adding one doesn't wait on LV2 instantiation"""
+
+import json
+import os
+import threading
+from collections import Counter
+from utils import config_dir
+
+# How many of the most used plugins are kept warm
+POOL_SIZE = 4
+# Far above any instanceNum PedalGraph.allocate hands out
+POOL_BASE = 9000
+
+
+def usageCounts(directory: str = config_dir) -> Counter:
+    """How often each plugin URI appears across the profiles"""
+    counts = Counter()
+    for name in os.listdir(directory):
+        if not name.endswith(".json") or "all_plugins" in name:
+            continue
+        try:
+            with open(os.path.join(directory, name), "r") as file:
+                plugins = json.load(file).get("plugins", [])
+        except (OSError, ValueError, AttributeError):
+            continue
+        counts.update(plugin["uri"] for plugin in plugins if "uri" in plugin)
+    return counts
+
+
+class WarmPool:
+    """Keeps one disconnected, bypassed instance of the most used plugins.
+
+    Adding a warm plugin to the board is then only a reconnect: take() hands
+    its instanceNum to the GUI, which wires it in with
+    PedalGraph.diff(warm=...), and the pool is topped up again in the
+    background. Instances are added one per job so user actions queued in
+    the meantime aren't held up.
+    """
+
+    def __init__(self, worker, uris: list[str]):
+        self.worker = worker
+        self.uris = uris
+        self.ready: dict[str, int] = {}
+        self.failed: set[str] = set()
+        self.nextNum = POOL_BASE
+        # Bumped when mod-host restarts so fills for the old one are ignored
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def mostUsed(catalog: list, size: int = POOL_SIZE) -> list[str]:
+        """URIs of the catalog plugins used most by the profiles"""
+        counts = usageCounts()
+        uris = [plugin.uri for plugin in catalog if counts[plugin.uri] > 0]
+        uris.sort(key=lambda uri: counts[uri], reverse=True)
+        return uris[:size]
+
+    def take(self, uri: str) -> int | None:
+        """Removes a warm instance of uri from the pool and returns its
+        instanceNum, None if there isn't one"""
+        with self.lock:
+            instanceNum = self.ready.pop(uri, None)
+        if instanceNum is not None:
+            self.refill()
+        return instanceNum
+
+    def clear(self):
+        """Forgets every instance, for when mod-host is restarted"""
+        with self.lock:
+            self.ready.clear()
+            self.generation += 1
+            self.nextNum = POOL_BASE
+
+    def refill(self):
+        self.worker.submit(self.fillOne, self.generation,
+                           callback=self.onFilled)
+
+    def onFilled(self, more):
+        if more:
+            self.refill()
+
+    def fillOne(self, client, generation: int) -> bool:
+        """Adds one missing instance. Returns True if more are missing"""
+        if client is None:
+            return False
+        with self.lock:
+            missing = [uri for uri in self.uris
+                       if uri not in self.ready and uri not in self.failed]
+            if not missing or generation != self.generation:
+                return False
+            uri = missing[0]
+            instanceNum = self.nextNum
+            self.nextNum += 1
+        with client.batch():
+            added = client.queue(f"add {uri} {instanceNum}")
+            client.queue(f"bypass {instanceNum} 1")
+        with self.lock:
+            if generation != self.generation:
+                return False
+            if added.code == instanceNum:
+                self.ready[uri] = instanceNum
+            else:
+                print(f"Couldn't pre-load {uri}, mod-host responded {added.code}")
+                self.failed.add(uri)
+        return len(missing) > 1